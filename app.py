@@ -1,14 +1,28 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash
+from flask import (Flask, render_template, request, jsonify, redirect, url_for, flash, make_response,
+                   Response, stream_with_context, send_from_directory)
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
-from ontology.loader import load_ontology, get_kidung_dataframe
-from owlready2 import destroy_entity as destroy
-from ontology.rules import KidungDecisionTree
-from ontology.query import get_kidung_detail, get_kidung_by_context
-import os, pandas as pd, requests, time
+from ontology.loader import load_ontology, get_kidung_dataframe, get_ontology_version, ONTO_PATH
+from ontology.query import (get_kidung_detail, get_kidung_details, build_option_graph,
+                            get_reference_options, recommend, SEMUA_TAHAP)
+from ontology.snapshot import KidungSnapshot, SNAPSHOT_PATH, collect_snapshot_data, write_snapshot, snapshot_is_current
+from ontology.rebuild import DebouncedRebuilder
+from ontology.reference import judul_key
+from ontology.sparql import SparqlService, SparqlError, SparqlTimeout, stream_json, stream_csv
+from functools import wraps
+from datetime import datetime, timezone
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+import os, sys, copy, gzip, hashlib, hmac, json, sqlite3, subprocess, threading, pandas as pd, requests, time
+from collections import OrderedDict
 from dotenv import load_dotenv
 
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
 load_dotenv()
 
 app = Flask(__name__)
@@ -17,6 +31,52 @@ app = Flask(__name__)
 app.config['SECRET_KEY']         = os.getenv('SECRET_KEY', 'sarikidung-secret-2026')
 app.config['SQLALCHEMY_DATABASE_URI']         = 'sqlite:///admin.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS']  = False
+# Pool koneksi per proses; timeout = tunggu lock tulis SQLite (detik) sebelum "database is locked"
+app.config['SQLALCHEMY_ENGINE_OPTIONS']       = {
+    'pool_size':    int(os.getenv('DB_POOL_SIZE', '5')),
+    'pool_recycle': 3600,
+    'connect_args': {'timeout': 15},
+}
+# Lama data user admin di-cache per proses untuk login_manager (detik)
+USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', '300'))
+
+# Mode serving:
+#   full     — owlready2 + DataFrame + model di proses ini; admin bisa menulis (default)
+#   readonly — hanya snapshot terkompilasi (mmap), tanpa owlready2/sklearn; rute tulis admin
+#              ditolak dan dilayani proses "full" terpisah. Jalankan dengan
+#              `SARIKIDUNG_MODE=readonly gunicorn --preload -w N app:app` supaya snapshot
+#              dimuat sekali di master lalu dibagi copy-on-write ke semua worker.
+SERVING_MODE            = os.getenv('SARIKIDUNG_MODE', 'full')
+SNAPSHOT_CHECK_INTERVAL = float(os.getenv('SNAPSHOT_CHECK_INTERVAL', '5'))
+
+# Mesin rekomendasi dipilih lewat SARIKIDUNG_ENGINE=tree|exact (ontology/rules.py);
+# bandingkan akurasi & latensinya dengan `python -m ontology.evaluate`.
+
+# Rebuild latar belakang setelah edit admin (detik)
+REBUILD_DEBOUNCE  = float(os.getenv('REBUILD_DEBOUNCE', '2'))
+REBUILD_MAX_DELAY = float(os.getenv('REBUILD_MAX_DELAY', '10'))
+
+# Endpoint SPARQL baca-saja: login admin atau header "Authorization: Bearer <SPARQL_API_TOKEN>"
+SPARQL_API_TOKEN = os.getenv('SPARQL_API_TOKEN', '')
+SPARQL_MAX_ROWS  = int(os.getenv('SPARQL_MAX_ROWS', '1000'))
+SPARQL_TIMEOUT   = float(os.getenv('SPARQL_TIMEOUT', '5'))
+
+# Rate limit per IP per kelas rute: "kapasitas/detik" (mis. "10/60" = 10 permintaan per 60 detik,
+# burst maksimal 10) dan batas konkurensi global per kelas (0 = tanpa batas).
+RATE_LIMITS = {
+    'chat':    os.getenv('RATE_LIMIT_CHAT',    '10/60'),
+    'predict': os.getenv('RATE_LIMIT_PREDICT', '60/60'),
+    'sparql':  os.getenv('RATE_LIMIT_SPARQL',  '30/60'),
+    'write':   os.getenv('RATE_LIMIT_WRITE',   '10/60'),
+}
+CONCURRENCY_LIMITS = {
+    'chat':  int(os.getenv('MAX_CONCURRENT_CHAT',  '4')),
+    'write': int(os.getenv('MAX_CONCURRENT_WRITE', '1')),
+}
+# Di belakang reverse proxy: percayai X-Forwarded-For supaya IP klien benar
+if os.getenv('TRUST_PROXY'):
+    from werkzeug.middleware.proxy_fix import ProxyFix
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1)
 
 # ─── EXTENSIONS ─────────────────────────────────────────────────
 db           = SQLAlchemy(app)
@@ -31,13 +91,73 @@ class AdminUser(UserMixin, db.Model):
     username = db.Column(db.String(80), unique=True, nullable=False)
     password = db.Column(db.String(200), nullable=False)
 
+class CachedAdminUser(UserMixin):
+    """Salinan ringan baris AdminUser untuk current_user — tidak terikat session SQLAlchemy."""
+
+    def __init__(self, user):
+        self.id       = user.id
+        self.username = user.username
+        self.password = user.password
+
+
+class UserCache:
+    """Cache TTL in-process untuk user_loader: request admin tidak perlu query admin.db."""
+
+    def __init__(self, ttl):
+        self.ttl     = ttl
+        self._users  = {}
+        self._lock   = threading.Lock()
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            hit = self._users.get(user_id)
+        if hit and hit[0] > now:
+            return hit[1]
+        user = db.session.get(AdminUser, user_id)
+        if user is None:
+            self.invalidate(user_id)
+            return None
+        return self.put(user)
+
+    def put(self, user):
+        cached = CachedAdminUser(user)
+        with self._lock:
+            self._users[cached.id] = (time.monotonic() + self.ttl, cached)
+        return cached
+
+    def invalidate(self, user_id=None):
+        with self._lock:
+            if user_id is None:
+                self._users.clear()
+            else:
+                self._users.pop(user_id, None)
+
+user_cache = UserCache(USER_CACHE_TTL)
+
 @login_manager.user_loader
 def load_user(user_id):
-    return AdminUser.query.get(int(user_id))
+    return user_cache.get(int(user_id))
 
 # ─── INIT DB & SEED ADMIN ───────────────────────────────────────
+_db_ready = False
+
+def _sqlite_pragmas(dbapi_conn, _record):
+    """WAL: pembaca tidak memblokir penulis antar worker; busy_timeout untuk antre lock tulis."""
+    if isinstance(dbapi_conn, sqlite3.Connection):
+        cur = dbapi_conn.cursor()
+        cur.execute("PRAGMA journal_mode=WAL")
+        cur.execute("PRAGMA synchronous=NORMAL")
+        cur.execute("PRAGMA busy_timeout=15000")
+        cur.close()
+
 def init_db():
+    """Skema + akun admin awal. Idempoten & aman dipanggil bersamaan oleh beberapa worker."""
+    global _db_ready
+    if _db_ready:
+        return
     with app.app_context():
+        event.listen(db.engine, 'connect', _sqlite_pragmas)
         db.create_all()
         if not AdminUser.query.filter_by(username='admin').first():
             admin = AdminUser(
@@ -45,20 +165,363 @@ def init_db():
                 password = generate_password_hash('sarikidung2026')
             )
             db.session.add(admin)
-            db.session.commit()
-            print("✅ Akun admin dibuat: admin / sarikidung2026")
+            try:
+                db.session.commit()
+                print("✅ Akun admin dibuat: admin / sarikidung2026")
+            except IntegrityError:
+                db.session.rollback()   # worker lain sudah lebih dulu membuatnya
+        # Tutup koneksi pool: init_db() jalan saat import, dan worker hasil fork
+        # (gunicorn --preload) tidak boleh mewarisi koneksi SQLite milik master
+        db.session.remove()
+        db.engine.dispose()
+    _db_ready = True
+
+def create_app():
+    """Entry point WSGI gaya factory (`gunicorn 'app:create_app()'`): database dijamin siap."""
+    init_db()
+    return app
+
+# ─── RATE LIMIT & ADMISSION CONTROL ─────────────────────────────
+class TokenBucketLimiter:
+    """
+    Token bucket in-process per (kelas rute, IP klien) + semaphore konkurensi per kelas.
+    Bucket disimpan urut terakhir dipakai; di atas MAX_BUCKETS yang paling lama
+    tidak aktif dibuang (O(1) per request).
+    """
+
+    MAX_BUCKETS = 10000
+
+    def __init__(self, limits, concurrency):
+        self.rates = {}
+        for cls, spec in limits.items():
+            cap, per = spec.split('/')
+            self.rates[cls] = (float(cap), float(cap) / float(per))
+        self.slots   = {cls: threading.BoundedSemaphore(n) for cls, n in concurrency.items() if n > 0}
+        self.buckets = OrderedDict()
+        self.rejected = {}
+        self._lock   = threading.Lock()
+
+    def take(self, cls, client):
+        """None bila diizinkan, selain itu detik yang harus ditunggu (Retry-After)."""
+        if cls not in self.rates:
+            return None
+        cap, rate = self.rates[cls]
+        now = time.monotonic()
+        key = (cls, client)
+        with self._lock:
+            tokens, last = self.buckets.pop(key, (cap, now))
+            tokens = min(cap, tokens + (now - last) * rate)
+            wait   = None if tokens >= 1 else (1 - tokens) / rate
+            self.buckets[key] = (tokens - 1 if wait is None else tokens, now)
+            while len(self.buckets) > self.MAX_BUCKETS:
+                self.buckets.popitem(last=False)
+            return wait
+
+    def reject(self, cls, reason):
+        with self._lock:
+            key = f"{cls}:{reason}"
+            self.rejected[key] = self.rejected.get(key, 0) + 1
+
+    def status(self):
+        with self._lock:
+            return {
+                "limits":      {c: {"burst": cap, "per_second": round(rate, 4)} for c, (cap, rate) in self.rates.items()},
+                "concurrency": dict(CONCURRENCY_LIMITS),
+                "rejected":    dict(self.rejected),
+                "buckets":     len(self.buckets),
+            }
+
+limiter = TokenBucketLimiter(RATE_LIMITS, CONCURRENCY_LIMITS)
+
+def _limit_response(message, status, retry_after):
+    resp = jsonify({"status": "error", "message": message, "reply": message})
+    resp.status_code = status
+    resp.headers['Retry-After'] = str(max(1, int(retry_after + 0.999)))
+    return resp
+
+def _limit_redirect(message):
+    """Rute form HTML: flash pesan lalu kembali ke form (atau panel admin bila rute hanya POST)."""
+    flash(message, 'warning')
+    if request.url_rule is not None and 'GET' in request.url_rule.methods:
+        return redirect(request.path)
+    return redirect(url_for('admin_panel'))
+
+def limited(cls, methods=None, html=False):
+    """
+    Terapkan rate limit (429) dan batas konkurensi (503) kelas `cls` pada rute.
+    html=True: rute form — tolakan berupa flash + redirect, bukan JSON.
+    """
+    def reject(message, status, retry_after):
+        if html:
+            return _limit_redirect(message)
+        return _limit_response(message, status, retry_after)
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if methods and request.method not in methods:
+                return view(*args, **kwargs)
+            wait = limiter.take(cls, request.remote_addr or 'unknown')
+            if wait is not None:
+                limiter.reject(cls, 'rate')
+                return reject("Terlalu banyak permintaan. Tunggu sebentar lalu coba lagi. 🙏", 429, wait)
+            slot = limiter.slots.get(cls)
+            if slot is None:
+                return view(*args, **kwargs)
+            if not slot.acquire(blocking=False):
+                limiter.reject(cls, 'busy')
+                return reject("Server sedang sibuk. Coba lagi dalam beberapa detik.", 503, 1)
+            try:
+                return view(*args, **kwargs)
+            finally:
+                slot.release()
+        return wrapper
+    return decorator
+
+# ─── CACHE RESPONS (HALAMAN PUBLIK & API JSON) ───────────────────
+# Body yang sudah dirender & dikompresi. Halaman per (path, versi ontologi),
+# detail kidung per nama individu (ETag = versi per record).
+# Kunci api_cache selalu memuat versi ontologi yang dibaca *sebelum* df/katalog, sehingga
+# entri yang selesai dibangun setelah rebuild tidak pernah tersaji untuk versi baru.
+# Semua dikosongkan setiap kali katalog berubah (lihat refresh_knowledge_base).
+page_cache   = {}
+api_cache    = {}
+detail_cache = {}
+
+API_MAX_AGE = int(os.getenv('API_CACHE_MAX_AGE', '300'))
+
+sparql_service = SparqlService(ONTO_PATH, max_rows=SPARQL_MAX_ROWS, timeout=SPARQL_TIMEOUT)
+
+def _build_cached_entry(body, etag=None):
+    return {
+        'identity': body,
+        'gzip':     gzip.compress(body, compresslevel=9),
+        'br':       brotli.compress(body) if brotli else None,
+        'etag':     etag or f"{onto_version}-{hashlib.sha1(body).hexdigest()[:8]}",
+    }
+
+def _build_json_entry(payload):
+    body = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return _build_cached_entry(body, etag=hashlib.sha1(body).hexdigest()[:16])
+
+def _pick_encoding(entry):
+    accepted = request.accept_encodings
+    if entry['br'] is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return 'identity'
+
+def serve_cached_entry(entry, mimetype, cache_control):
+    """Bangun respons dari entry cache: pilih encoding, pasang ETag/Last-Modified, jawab 304 bila cocok."""
+    encoding = _pick_encoding(entry)
+    resp = make_response(entry[encoding])
+    resp.mimetype = mimetype
+    if encoding != 'identity':
+        resp.headers['Content-Encoding'] = encoding
+    resp.headers['Vary']          = 'Accept-Encoding'
+    resp.headers['Cache-Control'] = cache_control
+    resp.set_etag(entry['etag'], weak=True)
+    if onto_modified:
+        resp.last_modified = onto_modified
+    return resp.make_conditional(request)
+
+def cached_page(view):
+    """Sajikan halaman publik dari cache pra-render + ETag/Last-Modified (304 untuk kunjungan ulang)."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key   = (request.path, onto_version)
+        entry = page_cache.get(key)
+        if entry is None:
+            entry = _build_cached_entry(view(*args, **kwargs).encode('utf-8'))
+            page_cache[key] = entry
+        return serve_cached_entry(entry, 'text/html', 'public, no-cache')
+    return wrapper
+
+def cached_json(entry):
+    return serve_cached_entry(entry, 'application/json', f'public, max-age={API_MAX_AGE}, must-revalidate')
+
+def _cache_detail(nama, detail):
+    entry = _build_json_entry({"status": "success", **detail})
+    entry['record'] = detail
+    detail_cache[nama] = entry
+    return entry
+
+def lookup_detail(nama):
+    return snapshot.detail(nama) if snapshot is not None else get_kidung_detail(onto, nama)
+
+def lookup_details(nama_list):
+    return snapshot.details(nama_list) if snapshot is not None else get_kidung_details(onto, nama_list)
+
+def catalog_ready():
+    return onto is not None or snapshot is not None
+
+def get_detail_entry(nama):
+    """Detail kidung siap saji (JSON terkompresi + ETag per record), None bila tidak ada."""
+    entry = detail_cache.get(nama)
+    if entry is None:
+        detail = lookup_detail(nama)
+        if not detail:
+            return None
+        entry = _cache_detail(nama, detail)
+    return entry
+
+def get_detail_records(nama_list):
+    """Detail banyak kidung: ambil dari cache, sisanya di-resolve dalam satu lintasan ontologi."""
+    records = {}
+    missing = []
+    for nama in nama_list:
+        entry = detail_cache.get(nama)
+        if entry is not None:
+            records[nama] = entry['record']
+        else:
+            missing.append(nama)
+    for nama, detail in lookup_details(missing).items():
+        records[nama] = _cache_detail(nama, detail)['record']
+    return records
 
 # ─── BOOTING ONTOLOGI ───────────────────────────────────────────
-onto      = None
-ai_engine = None
+onto          = None
+ai_engine     = None
+onto_version  = None
+onto_modified = None
+related_index = None
+playlists     = None
+ref_index     = None
+snapshot      = None
+_snapshot_checked_at = 0.0
 df = pd.DataFrame(columns=['target','judul','yadnya','upacara','pura','tahap','makna','jenis_sekar'])
 
+def _clear_response_caches():
+    page_cache.clear()
+    api_cache.clear()
+    detail_cache.clear()
+    sparql_service.clear()
+
+# owlready2 tidak aman untuk tulis paralel: edit admin & rebuild bergantian lewat lock ini
+onto_lock = threading.RLock()
+
+def refresh_knowledge_base(changed=None):
+    """
+    Muat ulang ontologi, DataFrame & model, lalu buang cache respons versi lama.
+    changed: nama individu yang baru diubah admin — related index cukup
+    diperbarui untuk kidung tersebut, bukan dibangun ulang seluruhnya.
+
+    onto_lock hanya dipegang selama membaca owlready2 (DataFrame, teks, urutan tahap,
+    detail snapshot); train model, related index, playlist & penulisan snapshot berjalan
+    di luar lock sehingga rute tulis admin tidak ikut menunggu.
+    Catatan: load_ontology() mengembalikan world owlready2 yang sama, jadi `onto` selalu
+    live — tulisan admin langsung terlihat di lookup detail mode penuh. Yang tertinggal
+    sampai pertukaran di akhir hanyalah df, model, related index, playlist, versi,
+    cache respons, dan snapshot worker baca-saja. Pertukaran dilakukan di bawah lock.
+    """
+    from ontology.rules import create_engine
+    from ontology.related import RelatedKidungIndex, get_kidung_texts
+    from ontology.playlist import CeremonyPlaylists, get_urutan_tahap
+    from ontology.reference import ReferenceIndex
+
+    global onto, df, ai_engine, onto_version, onto_modified, related_index, playlists, ref_index
+    full = related_index is None or changed is None
+    with onto_lock:
+        # Hanya pembacaan owlready2 di sini — sisanya bekerja dari salinan Python biasa
+        new_onto         = load_ontology()
+        new_df           = get_kidung_dataframe(new_onto)
+        texts            = get_kidung_texts(new_onto, None if full else list(changed))
+        urutan           = get_urutan_tahap(new_onto)
+        details, options = collect_snapshot_data(new_onto, new_df)
+        version          = get_ontology_version()
+        mtime            = int(os.path.getmtime(ONTO_PATH))
+
+    engine = create_engine()
+    engine.train(new_df)
+    if full:
+        related = RelatedKidungIndex().build(new_onto, new_df, texts)
+    else:
+        related = copy.deepcopy(related_index)
+        for target in changed:
+            related.sync_target(new_onto, new_df, target, texts)
+    # Playlist dibangun ulang penuh — murah, dan tahap/urutan bisa berubah di edit mana pun
+    playlist = CeremonyPlaylists().build(new_df, urutan)
+    modified = datetime.fromtimestamp(mtime, tz=timezone.utc)
+    try:
+        write_snapshot(new_df, details, options, engine, related, playlist, version, mtime)
+    except Exception as e:
+        print(f"⚠️ Gagal menulis snapshot: {e}")
+
+    with onto_lock:
+        # Indeks referensi dibangun & ditukar di bawah lock yang sama dengan rute admin:
+        # penambahan admin selama train tidak hilang, unique_name() tetap melihat semua nama
+        refs = ReferenceIndex().build(new_onto)
+        onto, df, ai_engine, related_index = new_onto, new_df, engine, related
+        playlists, ref_index               = playlist, refs
+        onto_version, onto_modified        = version, modified
+        _clear_response_caches()
+
+rebuilder = DebouncedRebuilder(lambda changed: refresh_knowledge_base(changed=changed),
+                               debounce=REBUILD_DEBOUNCE, max_delay=REBUILD_MAX_DELAY)
+
+def with_onto_lock(view):
+    """Serialisasi rute tulis admin terhadap rebuild latar belakang."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        with onto_lock:
+            return view(*args, **kwargs)
+    return wrapper
+
+def load_snapshot_state(compile_if_stale=True):
+    """
+    Mode baca-saja: pakai snapshot (kompilasi dulu di subprocess bila belum ada/usang).
+    compile_if_stale=False: hanya muat file yang ditulis proses admin, tanpa kompilasi.
+    """
+    global snapshot, df, ai_engine, playlists, onto_version, onto_modified, _snapshot_checked_at
+    if compile_if_stale and not snapshot_is_current():
+        # Subprocess: owlready2 & sklearn tidak pernah masuk memori proses serving
+        subprocess.run([sys.executable, '-m', 'ontology.snapshot'],
+                       cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+    snapshot      = KidungSnapshot(SNAPSHOT_PATH)
+    df            = pd.DataFrame(snapshot.rows, columns=df.columns)
+    ai_engine     = snapshot.predictor
+    playlists     = snapshot.playlists
+    onto_version  = snapshot.version
+    onto_modified = datetime.fromtimestamp(snapshot.modified, tz=timezone.utc)
+    _snapshot_checked_at = time.time()
+    _clear_response_caches()
+
+@app.before_request
+def reload_snapshot_if_changed():
+    """Mode baca-saja: ganti snapshot bila proses admin sudah menulis versi baru."""
+    global _snapshot_checked_at
+    if snapshot is None or time.time() - _snapshot_checked_at < SNAPSHOT_CHECK_INTERVAL:
+        return
+    _snapshot_checked_at = time.time()
+    try:
+        if os.path.getmtime(SNAPSHOT_PATH) != snapshot.mtime:
+            load_snapshot_state(compile_if_stale=False)
+            print(f"🔄 Snapshot dimuat ulang (versi ontologi {onto_version})")
+    except Exception as e:
+        print(f"⚠️ Gagal memuat ulang snapshot: {e}")
+
+def writer_required(view):
+    """Tolak rute tulis admin di mode baca-saja."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if SERVING_MODE == 'readonly':
+            flash('Server ini berjalan dalam mode baca-saja. Perubahan data dilakukan lewat proses admin.', 'warning')
+            return redirect(url_for('admin_panel'))
+        return view(*args, **kwargs)
+    return wrapper
+
+try:
+    init_db()
+except Exception as e:
+    print(f"❌ Gagal menyiapkan admin.db: {e}")
+
 try:
-    onto      = load_ontology()
-    df        = get_kidung_dataframe(onto)
-    ai_engine = KidungDecisionTree()
-    ai_engine.train(df)
-    print("✅ SariKidung siap.")
+    if SERVING_MODE == 'readonly':
+        load_snapshot_state()
+    else:
+        refresh_knowledge_base()
+    print(f"✅ SariKidung siap. (mode {SERVING_MODE}, versi ontologi {onto_version})")
 except Exception as e:
     print(f"❌ Gagal booting: {e}")
 
@@ -72,7 +535,7 @@ QUESTION_LABELS = {
     'pura':    'Di Pura atau Tempat mana upacara dilaksanakan?',
 }
 
-SEMUA_TAHAP = "── Semua Tahap (Panduan Lengkap) ──"
+TAHAP_HINT = "Pilih tahap tertentu atau 'Semua Tahap' untuk panduan lengkap upacara."
 
 # ─── GROQ CONFIG ────────────────────────────────────────────────
 GROQ_API_KEY = os.getenv("GROQ_API_KEY", "")
@@ -99,28 +562,34 @@ ATURAN PENTING:
 # ═══════════════════════════════════════════════════════════════
 
 @app.route('/')
+@cached_page
 def landing():
     return render_template('pages/index.html')
 
 @app.route('/home')
+@cached_page
 def home():
     total = len(df) if not df.empty else 0
     return render_template('pages/home.html', total_kidung=total)
 
 @app.route('/browsing')
+@cached_page
 def browsing():
     return render_template('pages/browsing.html')
 
 @app.route('/library')
+@cached_page
 def library():
     kidung_list = df.to_dict(orient='records') if not df.empty else []
     return render_template('pages/library.html', kidungs=kidung_list)
 
 @app.route('/about')
+@cached_page
 def about():
     return render_template('pages/about.html')
 
 @app.route('/questionnaire')
+@cached_page
 def questionnaire():
     return render_template('pages/questionnaire.html')
 
@@ -128,6 +597,14 @@ def questionnaire():
 def chat_page():
     return render_template('pages/chat.html')
 
+@app.route('/sw.js')
+def service_worker():
+    # Disajikan dari root supaya scope service worker mencakup seluruh situs
+    resp = send_from_directory(app.static_folder, 'sw.js', mimetype='application/javascript')
+    resp.headers['Cache-Control'] = 'no-cache'
+    resp.headers['Service-Worker-Allowed'] = '/'
+    return resp
+
 
 # ═══════════════════════════════════════════════════════════════
 # ROUTES — ADMIN
@@ -144,7 +621,7 @@ def admin_login():
         user     = AdminUser.query.filter_by(username=username).first()
 
         if user and check_password_hash(user.password, password):
-            login_user(user)
+            login_user(user_cache.put(user))
             flash('Login berhasil. Rahajeng! 🙏', 'success')
             return redirect(url_for('admin_panel'))
         else:
@@ -162,8 +639,9 @@ def admin_panel():
         stats_yadnya = df['yadnya'].value_counts().to_dict()
     all_kidungs = []
     if not df.empty:
+        details = get_detail_records(df['target'].tolist())
         for _, row in df.iterrows():
-            detail = get_kidung_detail(onto, row['target']) or {}
+            detail = details.get(row['target'], {})
             all_kidungs.append({
                 'target':     row['target'],
                 'judul':      detail.get('judul', row['target'].replace('_',' ')),
@@ -175,11 +653,79 @@ def admin_panel():
     return render_template('admin/panel.html',
                            total_kidung=total_kidung,
                            stats_yadnya=stats_yadnya,
-                           all_kidungs=all_kidungs)
+                           all_kidungs=all_kidungs,
+                           rebuild=rebuilder.status())
+
+
+@app.route('/admin/rebuild-status')
+@login_required
+def admin_rebuild_status():
+    return jsonify({"status": "success", "versi": onto_version, **rebuilder.status()})
+
+
+@app.route('/admin/rate-limits')
+@login_required
+def admin_rate_limits():
+    return jsonify({"status": "success", **limiter.status()})
+
+
+# ─── VALIDASI FORM KIDUNG (indeks referensi, tanpa search_one) ──────────
+REF_PROPERTIES = [
+    ('yadnya',      'memilikiJenisYadnya'),
+    ('jenis_sekar', 'memilikiJenisKidung'),
+    ('upacara',     'digunakanPadaUpacara'),
+    ('tahap',       'digunakanPadaTahap'),
+    ('pura',        'digunakanDiPura'),
+]
+# Relasi yang boleh diisi nilai baru dari form (dibuat sebagai individual _Ref)
+NEW_REF_FIELDS = ('upacara', 'tahap', 'pura')
+
+def validate_references(data):
+    """Jenis yadnya & jenis sekar wajib cocok dengan individual yang sudah ada."""
+    for field, label in (('yadnya', 'Jenis Yadnya'), ('jenis_sekar', 'Jenis Sekar')):
+        if data[field] and ref_index.resolve(field, data[field]) is None:
+            flash(f'{label} "{data[field]}" tidak dikenal di ontologi.', 'danger')
+            return False
+    return True
+
+def check_duplicate_judul(data, exclude=None):
+    """
+    Peringatan judul kembar/mirip sebelum menulis. True = tampilkan form lagi;
+    admin bisa mencentang "tetap simpan" (abaikan_duplikat) untuk melanjutkan.
+    """
+    if request.form.get('abaikan_duplikat'):
+        return False
+    exact, near = ref_index.find_duplicates(data['judul'], exclude=exclude)
+    if exact:
+        flash(f'Judul "{data["judul"]}" sudah dipakai kidung lain: {", ".join(exact[:5])}.', 'warning')
+    if near:
+        flash(f'Judul mirip dengan: {", ".join(near[:5])}.', 'warning')
+    data['duplikat'] = bool(exact or near)
+    return data['duplikat']
+
+def apply_references(onto_admin, kidung, data, create_missing):
+    """Set object property dari form lewat indeks; nilai upacara/tahap/pura baru dibuat bila diizinkan."""
+    from ontology.reference import REF_CLASSES
+    for field, prop in REF_PROPERTIES:
+        if not data[field]:
+            continue
+        ref = ref_index.resolve(field, data[field])
+        if ref is None and create_missing and field in NEW_REF_FIELDS:
+            ParentClass = getattr(onto_admin, REF_CLASSES[field], None)
+            if ParentClass:
+                clean = data[field].replace(' ', '_')
+                ref = ParentClass(f"{clean}_Ref", namespace=onto_admin)
+                ref_index.add_reference(ref)
+                print(f"✅ Individual baru dibuat: {clean}_Ref sebagai {REF_CLASSES[field]}")
+        if ref is not None:
+            setattr(kidung, prop, [ref])
 
 
 @app.route('/admin/tambah', methods=['GET', 'POST'])
 @login_required
+@writer_required
+@limited('write', methods=('POST',), html=True)
+@with_onto_lock
 def admin_tambah():
     if request.method == 'POST':
         data = {
@@ -200,19 +746,18 @@ def admin_tambah():
         if not data['judul'] or not data['yadnya']:
             flash('Judul dan Jenis Yadnya wajib diisi.', 'danger')
             return render_template('admin/tambah.html', data=data)
+        if not validate_references(data) or check_duplicate_judul(data):
+            return render_template('admin/tambah.html', data=data)
 
         try:
             import re
-            from ontology.loader import ONTO_PATH
             from ontology.query import get_platform
 
             onto_admin = load_ontology()
 
             # 1. Generate nama individual yang unik & aman
-            nama_individual = re.sub(r'[^a-zA-Z0-9]', '_', data['judul']).strip('_')
-            existing = onto_admin.search_one(iri=f"*{nama_individual}")
-            if existing:
-                nama_individual = f"{nama_individual}_{int(time.time())}"
+            nama_individual = ref_index.unique_name(
+                re.sub(r'[^a-zA-Z0-9]', '_', data['judul']).strip('_') or 'Kidung')
 
             # 2. Buat individual baru sebagai instance KidungPancaYadnya
             KidungClass = onto_admin.KidungPancaYadnya
@@ -230,62 +775,17 @@ def admin_tambah():
                 plat = get_platform(data['url_audio'])
                 if plat: kidung_baru.platform_audio = [plat]
 
-            # 4. Set object properties
-            yadnya_map = {
-                'Dewa Yadnya':   'DewaYadnya',
-                'Pitra Yadnya':  'PitraYadnya',
-                'Manusa Yadnya': 'ManusaYadnya',
-                'Bhuta Yadnya':  'BhutaYadnya',
-                'Rsi Yadnya':    'RsiYadnya',
-            }
-            sekar_map = {
-                'Sekar Alit':  'KidungSekarAlit',
-                'Sekar Madya': 'KidungSekarMadya',
-                'Sekar Agung': 'KidungWargasari',
-            }
-
-            if data['yadnya'] in yadnya_map:
-                ref = onto_admin.search_one(iri=f"*{yadnya_map[data['yadnya']]}")
-                if ref: kidung_baru.memilikiJenisYadnya = [ref]
-
-            if data['jenis_sekar'] in sekar_map:
-                ref = onto_admin.search_one(iri=f"*{sekar_map[data['jenis_sekar']]}")
-                if ref: kidung_baru.memilikiJenisKidung = [ref]
-
-            # Map field → class ontologi untuk auto-buat individual baru
-            class_map = {
-                'upacara': 'UpacaraPancaYadnya',
-                'tahap':   'TahapPelaksanaanUpacara',
-                'pura':    'PuraTempatPelaksanaan',
-            }
-            for field, prop in [
-                ('upacara', 'digunakanPadaUpacara'),
-                ('tahap',   'digunakanPadaTahap'),
-                ('pura',    'digunakanDiPura'),
-            ]:
-                if data[field]:
-                    clean = data[field].replace(' ', '_')
-                    ref = onto_admin.search_one(iri=f"*{clean}_Ref") \
-                       or onto_admin.search_one(iri=f"*{clean}")
-                    if not ref:
-                        # Nilai baru — buat individual otomatis di ontologi
-                        ParentClass = onto_admin.search_one(iri=f"*{class_map[field]}")
-                        if ParentClass:
-                            ref = ParentClass(f"{clean}_Ref", namespace=onto_admin)
-                            print(f"✅ Individual baru dibuat: {clean}_Ref sebagai {class_map[field]}")
-                    if ref: setattr(kidung_baru, prop, [ref])
+            # 4. Set object properties (upacara/tahap/pura baru dibuat sebagai individual _Ref)
+            apply_references(onto_admin, kidung_baru, data, create_missing=True)
 
             # 5. Simpan ke file OWL
             onto_admin.save(file=ONTO_PATH, format="rdfxml")
+            ref_index.add_kidung(kidung_baru, data['judul'])
 
-            # 6. Reload ontologi & retrain AI
-            global onto, df, ai_engine
-            onto      = load_ontology()
-            df        = get_kidung_dataframe(onto)
-            ai_engine = KidungDecisionTree()
-            ai_engine.train(df)
+            # 6. Reload ontologi & retrain AI di latar belakang (digabung dengan edit lain)
+            rebuilder.submit([nama_individual])
 
-            flash(f'Kidung "{data["judul"]}" berhasil ditambahkan!', 'success')
+            flash(f'Kidung "{data["judul"]}" berhasil ditambahkan! Indeks diperbarui di latar belakang.', 'success')
             return redirect(url_for('admin_panel'))
 
         except Exception as e:
@@ -305,15 +805,18 @@ def admin_ganti_password():
         baru  = request.form.get('password_baru', '')
         ulang = request.form.get('password_ulang', '')
 
-        if not check_password_hash(current_user.password, lama):
+        # Baca ulang dari database: cache worker ini bisa tertinggal perubahan dari worker lain
+        user = db.session.get(AdminUser, current_user.id)
+        if not check_password_hash(user.password, lama):
             flash('Password lama salah.', 'danger')
         elif len(baru) < 8:
             flash('Password baru minimal 8 karakter.', 'danger')
         elif baru != ulang:
             flash('Konfirmasi password tidak cocok.', 'danger')
         else:
-            current_user.password = generate_password_hash(baru)
+            user.password = generate_password_hash(baru)
             db.session.commit()
+            user_cache.invalidate(user.id)
             flash('Password berhasil diubah!', 'success')
             return redirect(url_for('admin_panel'))
 
@@ -366,7 +869,7 @@ def get_options():
                 "options":      options,
                 "step":         step_index + 1,
                 "total_steps":  len(FEATURES),
-                "hint":         "Pilih tahap tertentu atau 'Semua Tahap' untuk panduan lengkap upacara.",
+                "hint":         TAHAP_HINT,
             })
 
         if next_feat == 'pura':
@@ -398,71 +901,98 @@ def get_options():
     return jsonify({"status": "complete"})
 
 
-@app.route('/predict', methods=['POST'])
+@app.route('/api/option-graph', methods=['GET'])
+def api_option_graph():
+    """
+    Seluruh graf keputusan kuesioner dalam satu dokumen (versi + cacheable),
+    supaya browsing.html bisa berjalan lokal tanpa round trip per langkah.
+    """
+    version, frame = onto_version, df
+    if frame.empty:
+        return jsonify({"status": "error", "message": "Data tidak tersedia."})
+    key   = ('option_graph', version)
+    entry = api_cache.get(key)
+    if entry is None:
+        entry = _build_json_entry({"status": "success", **option_graph_payload(version, frame)})
+        api_cache[key] = entry
+    return cached_json(entry)
+
+
+def option_graph_payload(version, frame):
+    return {
+        "version":     version,
+        "features":    FEATURES,
+        "labels":      QUESTION_LABELS,
+        "semua_tahap": SEMUA_TAHAP,
+        "hints":       {"tahap": TAHAP_HINT},
+        "graph":       build_option_graph(frame, FEATURES),
+    }
+
+
+# ─── KATALOG OFFLINE (bundle + manifest untuk service worker / catalog.js) ───
+def _catalog_records(targets, version):
+    """Record lengkap untuk bundle — dibaca dari snapshot terkompilasi bila versinya cocok."""
+    snap = snapshot
+    if snap is None and os.path.exists(SNAPSHOT_PATH):
+        try:
+            snap = KidungSnapshot(SNAPSHOT_PATH)
+            if snap.version != version:
+                snap = None
+        except Exception:
+            snap = None
+    return snap.details(targets) if snap is not None else lookup_details(targets)
+
+def _catalog_entries():
+    """(bundle, manifest) siap saji, dibangun sekali per versi ontologi."""
+    version, frame = onto_version, df
+    key = ('catalog', version)
+    if key not in api_cache:
+        rows    = frame.to_dict(orient='records') if not frame.empty else []
+        records = _catalog_records([r['target'] for r in rows], version)
+        hashes  = {
+            t: hashlib.sha1(json.dumps(rec, ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+            for t, rec in records.items()
+        }
+        common = {"status": "success", "version": version, "rows": rows,
+                  "graph": option_graph_payload(version, frame), "hashes": hashes}
+        api_cache[key] = (_build_json_entry({**common, "records": records}), _build_json_entry(common))
+    return api_cache[key]
+
+@app.route('/api/catalog/bundle', methods=['GET'])
+def api_catalog_bundle():
+    """Katalog lengkap (ringkasan, graf opsi, lirik & detail) untuk disimpan klien secara offline."""
+    if not catalog_ready():
+        return jsonify({"status": "error", "message": "Sistem belum siap."})
+    return cached_json(_catalog_entries()[0])
+
+@app.route('/api/catalog/manifest', methods=['GET'])
+def api_catalog_manifest():
+    """
+    Versi + hash per record (+ ringkasan & graf yang kecil). Klien membandingkan hash
+    dengan salinan lokalnya lalu hanya mengambil record yang berubah lewat /api/kidung/batch.
+    """
+    if not catalog_ready():
+        return jsonify({"status": "error", "message": "Sistem belum siap."})
+    return cached_json(_catalog_entries()[1])
+
+
+@app.route('/predict', methods=['GET', 'POST'])
+@limited('predict')
 def predict():
     try:
-        if ai_engine is None or onto is None:
+        if ai_engine is None or not catalog_ready():
             return jsonify({"status": "error", "message": "Sistem belum siap."})
 
-        data = request.json or {}
+        # GET /predict?target=<nama> — varian yang bisa di-cache browser & reverse proxy
+        data = request.args.to_dict() if request.method == 'GET' else (request.json or {})
 
         if 'target' in data and len(data) == 1:
-            detail = get_kidung_detail(onto, data['target'])
-            if detail:
-                return jsonify({"status": "success", **detail})
+            entry = get_detail_entry(data['target'])
+            if entry:
+                return cached_json(entry)
             return jsonify({"status": "error", "message": "Kidung tidak ditemukan."})
 
-        cleaned     = {k: str(v).strip() for k, v in data.items()}
-        tahap_pilih = cleaned.get('tahap', '')
-        mode_semua  = (not tahap_pilih or tahap_pilih in ('None', SEMUA_TAHAP))
-
-        nama = ai_engine.predict({
-            k: v for k, v in cleaned.items()
-            if k != 'tahap' or not mode_semua
-        })
-
-        per_tahap = get_kidung_by_context(
-            onto, df,
-            yadnya       = cleaned.get('yadnya'),
-            upacara      = cleaned.get('upacara'),
-            pura         = cleaned.get('pura'),
-            tahap_filter = None if mode_semua else tahap_pilih,
-        )
-
-        if not per_tahap:
-            return jsonify({
-                "status":  "fallback",
-                "message": (
-                    "Kidung untuk konteks ini belum tersedia dalam basis pengetahuan. "
-                    "Coba pilih konteks yang lebih umum atau konsultasikan dengan pemangku setempat."
-                ),
-                "konteks": cleaned,
-            })
-
-        detail_utama = get_kidung_detail(onto, nama) if nama else None
-        if not detail_utama:
-            detail_utama = per_tahap[0]
-
-        explanation    = ai_engine.build_explanation(cleaned, detail_utama.get('judul', ''))
-        top_candidates = ai_engine.get_top_candidates(
-            {k: v for k, v in cleaned.items() if k in ['yadnya', 'upacara', 'pura']},
-            n=3
-        )
-
-        return jsonify({
-            "status":           "success",
-            "judul":            detail_utama.get('judul', ''),
-            "teks":             detail_utama.get('teks', '-'),
-            "makna":            detail_utama.get('makna_mendalam', '-'),
-            "bahasa":           detail_utama.get('bahasa', '-'),
-            **detail_utama,
-            "kidung_per_tahap": per_tahap,
-            "explanation":      explanation,
-            "top_candidates":   top_candidates,
-            "total_ditemukan":  len(per_tahap),
-            "mode_semua_tahap": mode_semua,
-            "konteks":          cleaned,
-        })
+        return jsonify(recommend(ai_engine, df, data, get_detail_records, playlists))
 
     except Exception as e:
         import traceback
@@ -471,13 +1001,50 @@ def predict():
         return jsonify({"status": "error", "message": f"Error sistem: {str(e)}"}), 500
 
 
+@app.route('/api/playlist', methods=['GET'])
+def api_playlist():
+    """
+    Panduan kidung satu upacara, urut urutanTahap: ?yadnya=&upacara=&pura=[&tahap=][&fields=judul,tahap]
+    Tanpa tahap (atau "Semua Tahap") = seluruh rangkaian upacara. Dari tabel playlist terhitung.
+    """
+    version = onto_version
+    if playlists is None or not catalog_ready():
+        return jsonify({"status": "error", "message": "Sistem belum siap."})
+    args   = {k: request.args.get(k, '').strip() for k in ('yadnya', 'upacara', 'pura', 'tahap')}
+    fields = [f for f in request.args.get('fields', '').split(',') if f]
+    if args['tahap'] == SEMUA_TAHAP:
+        args['tahap'] = ''
+    targets = playlists.get(args['yadnya'], args['upacara'], args['pura'], args['tahap'] or None)
+    records = get_detail_records(targets)
+    targets = [t for t in targets if t in records]
+    if records:
+        known  = next(iter(records.values())).keys()
+        fields = tuple(f for f in fields if FIELD_ALIASES.get(f, f) in known)
+    # Kunci = hasil yang sudah di-resolve (bukan teks query) supaya cache tidak tumbuh tanpa batas
+    key   = ('playlist', version, tuple(targets), tuple(fields))
+    entry = api_cache.get(key)
+    if entry is None:
+        kidung = [records[t] for t in targets]
+        if fields:
+            kidung = [{f: rec.get(FIELD_ALIASES.get(f, f)) for f in fields} for rec in kidung]
+        entry = _build_json_entry({
+            "status":  "success",
+            "targets": targets,
+            "kidung":  kidung,
+            "total":   len(kidung),
+        })
+        api_cache[key] = entry
+    return cached_json(entry)
+
+
 @app.route('/admin/kidung')
 @login_required
 def admin_kidung():
     all_kidungs = []
     if not df.empty:
+        details = get_detail_records(df['target'].tolist())
         for _, row in df.iterrows():
-            detail = get_kidung_detail(onto, row['target']) or {}
+            detail = details.get(row['target'], {})
             all_kidungs.append({
                 'target':      row['target'],
                 'judul':       detail.get('judul', row['target'].replace('_',' ')),
@@ -491,6 +1058,9 @@ def admin_kidung():
 
 @app.route('/admin/edit/<target>', methods=['GET', 'POST'])
 @login_required
+@writer_required
+@limited('write', methods=('POST',), html=True)
+@with_onto_lock
 def admin_edit(target):
     if request.method == 'POST':
         data = {
@@ -508,14 +1078,17 @@ def admin_edit(target):
             'sumber':     request.form.get('sumber', '').strip(),
             'url_audio':  request.form.get('url_audio', '').strip(),
         }
+        kidung = ref_index.kidung.get(target) if ref_index is not None else None
+        if not kidung:
+            flash('Kidung tidak ditemukan.', 'danger')
+            return redirect(url_for('admin_panel'))
+        judul_berubah = data['judul'] and judul_key(data['judul']) != judul_key(ref_index.titles.get(target, ''))
+        if not validate_references(data) or (judul_berubah and check_duplicate_judul(data, exclude=target)):
+            data['jenis_yadnya'] = data['yadnya']
+            return render_template('admin/edit.html', data=data)
         try:
             from ontology.query import get_platform
-            from ontology.loader import ONTO_PATH
             onto_admin = load_ontology()
-            kidung = onto_admin.search_one(iri=f"*{target}")
-            if not kidung:
-                flash('Kidung tidak ditemukan.', 'danger')
-                return redirect(url_for('admin_panel'))
 
             if data['judul']:  kidung.judulKidung   = [data['judul']]
             if data['bahasa']: kidung.bahasa         = [data['bahasa']]
@@ -531,43 +1104,15 @@ def admin_edit(target):
                 kidung.url_audio      = []
                 kidung.platform_audio = []
 
-            yadnya_map = {
-                'Dewa Yadnya':   'DewaYadnya',   'Pitra Yadnya':  'PitraYadnya',
-                'Manusa Yadnya': 'ManusaYadnya', 'Bhuta Yadnya':  'BhutaYadnya',
-                'Rsi Yadnya':    'RsiYadnya',
-            }
-            sekar_map = {
-                'Sekar Alit':  'KidungSekarAlit',
-                'Sekar Madya': 'KidungSekarMadya',
-                'Sekar Agung': 'KidungWargasari',
-            }
-            if data['yadnya'] in yadnya_map:
-                ref = onto_admin.search_one(iri=f"*{yadnya_map[data['yadnya']]}")
-                if ref: kidung.memilikiJenisYadnya = [ref]
-            if data['jenis_sekar'] in sekar_map:
-                ref = onto_admin.search_one(iri=f"*{sekar_map[data['jenis_sekar']]}")
-                if ref: kidung.memilikiJenisKidung = [ref]
-            for field, prop in [
-                ('upacara', 'digunakanPadaUpacara'),
-                ('tahap',   'digunakanPadaTahap'),
-                ('pura',    'digunakanDiPura'),
-            ]:
-                if data[field]:
-                    clean = data[field].replace(' ', '_')
-                    ref = onto_admin.search_one(iri=f"*{clean}_Ref") \
-                       or onto_admin.search_one(iri=f"*{clean}")
-                    if ref: setattr(kidung, prop, [ref])
+            apply_references(onto_admin, kidung, data, create_missing=False)
 
             onto_admin.save(file=ONTO_PATH, format="rdfxml")
+            if data['judul']:
+                ref_index.add_kidung(kidung, data['judul'])
 
-            # ✅ Fix: gunakan nama variabel global yang benar
-            global onto, df, ai_engine
-            onto      = load_ontology()
-            df        = get_kidung_dataframe(onto)
-            ai_engine = KidungDecisionTree()
-            ai_engine.train(df)
+            rebuilder.submit([target])
 
-            flash(f'Kidung "{data["judul"]}" berhasil diperbarui!', 'success')
+            flash(f'Kidung "{data["judul"]}" berhasil diperbarui! Indeks diperbarui di latar belakang.', 'success')
             return redirect(url_for('admin_panel'))
         except Exception as e:
             import traceback
@@ -575,7 +1120,7 @@ def admin_edit(target):
             flash(f'Gagal update: {str(e)}', 'danger')
             return render_template('admin/edit.html', data=data)
 
-    detail = get_kidung_detail(onto, target)
+    detail = lookup_detail(target)
     if not detail:
         flash('Kidung tidak ditemukan.', 'danger')
         return redirect(url_for('admin_panel'))
@@ -585,11 +1130,14 @@ def admin_edit(target):
 
 @app.route('/admin/hapus/<target>', methods=['POST'])
 @login_required
+@writer_required
+@limited('write', html=True)
+@with_onto_lock
 def admin_hapus(target):
     try:
-        from ontology.loader import ONTO_PATH
+        from owlready2 import destroy_entity as destroy
         onto_admin = load_ontology()
-        kidung = onto_admin.search_one(iri=f"*{target}")
+        kidung = ref_index.kidung.get(target) if ref_index is not None else None
         if not kidung:
             flash('Kidung tidak ditemukan.', 'danger')
             return redirect(url_for('admin_panel'))
@@ -597,15 +1145,11 @@ def admin_hapus(target):
         judul = (kidung.judulKidung[0] if kidung.judulKidung else target.replace('_', ' '))
         destroy(kidung)
         onto_admin.save(file=ONTO_PATH, format="rdfxml")
+        ref_index.remove_kidung(target)
 
-        # ✅ Fix: gunakan nama variabel global yang benar
-        global onto, df, ai_engine
-        onto      = load_ontology()
-        df        = get_kidung_dataframe(onto)
-        ai_engine = KidungDecisionTree()
-        ai_engine.train(df)
+        rebuilder.submit([target])
 
-        flash(f'Kidung "{judul}" berhasil dihapus.', 'success')
+        flash(f'Kidung "{judul}" berhasil dihapus. Indeks diperbarui di latar belakang.', 'success')
     except Exception as e:
         flash(f'Gagal hapus: {str(e)}', 'danger')
     return redirect(url_for('admin_panel'))
@@ -613,45 +1157,143 @@ def admin_hapus(target):
 
 @app.route('/api/options', methods=['GET'])
 def api_options():
-    if onto is None:
+    if not catalog_ready():
         return jsonify({"status": "error"})
     try:
-        def get_individuals(class_name):
-            cls = onto.search_one(iri=f"*{class_name}")
-            if not cls:
-                return []
-            return sorted([
-                ind.name.replace("_Ref", "").replace("_", " ").strip()
-                for ind in cls.instances()
-                if ind.name.endswith("_Ref")
-            ])
-
-        return jsonify({
-            "status":  "success",
-            "upacara": get_individuals("UpacaraPancaYadnya"),
-            "tahap":   get_individuals("TahapPelaksanaanUpacara"),
-            "pura":    get_individuals("PuraTempatPelaksanaan"),
-            "makna":   get_individuals("MaknaKidung"),
-        })
+        key   = ('options', onto_version)
+        entry = api_cache.get(key)
+        if entry is None:
+            options = snapshot.options if snapshot is not None else get_reference_options(onto)
+            entry = _build_json_entry({"status": "success", **options})
+            api_cache[key] = entry
+        return cached_json(entry)
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)})
 
 
 @app.route('/api/kidung/<nama>', methods=['GET'])
 def detail_kidung(nama):
-    if onto is None:
+    if not catalog_ready():
         return jsonify({"status": "error", "message": "Sistem belum siap."})
-    detail = get_kidung_detail(onto, nama)
-    if detail:
-        return jsonify({"status": "success", **detail})
+    entry = get_detail_entry(nama)
+    if entry:
+        return cached_json(entry)
     return jsonify({"status": "error", "message": "Kidung tidak ditemukan."})
 
 
+@app.route('/api/kidung/<nama>/related', methods=['GET'])
+def related_kidung(nama):
+    """Kidung serupa (upacara/tahap/pura/yadnya/jenis sekar + kemiripan teks), dari tabel top-k."""
+    version = onto_version
+    if related_index is None and snapshot is None:
+        return jsonify({"status": "error", "message": "Sistem belum siap."})
+    related = snapshot.related(nama) if snapshot is not None else \
+              (related_index.related(nama) if nama in related_index.pos else None)
+    if related is None:
+        return jsonify({"status": "error", "message": "Kidung tidak ditemukan."})
+    key   = ('related', version, nama)
+    entry = api_cache.get(key)
+    if entry is None:
+        entry = _build_json_entry({
+            "status":  "success",
+            "target":  nama,
+            "related": related,
+        })
+        api_cache[key] = entry
+    return cached_json(entry)
+
+
+BATCH_MAX_TARGETS = 100
+FIELD_ALIASES     = {'yadnya': 'jenis_yadnya'}
+
+@app.route('/api/kidung/batch', methods=['GET', 'POST'])
+def detail_kidung_batch():
+    """
+    Detail banyak kidung dalam satu panggilan.
+    POST {"targets": [...], "fields": [...]} atau GET ?targets=a,b&fields=judul,yadnya
+    "fields" opsional — proyeksi kolom untuk tampilan daftar.
+    """
+    if not catalog_ready():
+        return jsonify({"status": "error", "message": "Sistem belum siap."})
+
+    if request.method == 'GET':
+        targets = [t for t in request.args.get('targets', '').split(',') if t]
+        fields  = [f for f in request.args.get('fields', '').split(',') if f]
+    else:
+        data    = request.get_json(silent=True)
+        if data is None:
+            data = {}
+        if not isinstance(data, dict):
+            return jsonify({"status": "error", "message": "Body JSON harus berupa objek."}), 400
+        targets = data.get('targets') or []
+        fields  = data.get('fields') or []
+
+    if not isinstance(targets, list) or not isinstance(fields, list):
+        return jsonify({"status": "error", "message": "targets dan fields harus berupa list."}), 400
+    targets = list(dict.fromkeys(str(t).strip() for t in targets if str(t).strip()))
+    if len(targets) > BATCH_MAX_TARGETS:
+        return jsonify({"status": "error", "message": f"Maksimal {BATCH_MAX_TARGETS} kidung per permintaan."}), 400
+
+    records = get_detail_records(targets)
+    if fields:
+        records = {
+            nama: {f: rec.get(FIELD_ALIASES.get(f, f)) for f in fields}
+            for nama, rec in records.items()
+        }
+
+    return jsonify({
+        "status":  "success",
+        "records": records,
+        "missing": [t for t in targets if t not in records],
+    })
+
+
+def _sparql_authorized():
+    if current_user.is_authenticated:
+        return True
+    auth = request.headers.get('Authorization', '')
+    return bool(SPARQL_API_TOKEN) and auth.startswith('Bearer ') and \
+        hmac.compare_digest(auth[len('Bearer '):].strip(), SPARQL_API_TOKEN)
+
+@app.route('/api/sparql', methods=['GET', 'POST'])
+@limited('sparql')
+def api_sparql():
+    """
+    Query SPARQL SELECT ad-hoc atas isi kidung.owx saat ini (baca-saja).
+    Parameter: query, format=json|csv (atau header Accept: text/csv).
+    """
+    if not _sparql_authorized():
+        return jsonify({"status": "error", "message": "Autentikasi diperlukan."}), 401
+    if onto is None:
+        return jsonify({"status": "error",
+                        "message": "SPARQL hanya tersedia di proses admin (mode full)."}), 503
+
+    params = request.values if request.method == 'GET' or not request.is_json else (request.json or {})
+    query  = str(params.get('query', '')).strip()
+    fmt    = params.get('format') or ('csv' if request.accept_mimetypes.best == 'text/csv' else 'json')
+    if not query:
+        return jsonify({"status": "error", "message": "Parameter 'query' kosong."}), 400
+
+    try:
+        # Tanpa onto_lock: query berjalan di salinan quadstore milik SparqlService
+        result = sparql_service.run(query)
+    except SparqlTimeout as e:
+        return jsonify({"status": "error", "message": str(e)}), 504
+    except SparqlError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    headers = {'X-Ontology-Version': result['version'], 'Cache-Control': 'private, no-store'}
+    if fmt == 'csv':
+        return Response(stream_with_context(stream_csv(result)), mimetype='text/csv', headers=headers)
+    return Response(stream_with_context(stream_json(result)), mimetype='application/json', headers=headers)
+
+
 # ═══════════════════════════════════════════════════════════════
 # API — CHAT AI (Groq)
 # ═══════════════════════════════════════════════════════════════
 
 @app.route('/api/chat', methods=['POST'])
+@limited('chat')
 def api_chat():
     try:
         if not GROQ_API_KEY or GROQ_API_KEY == "your_groq_api_key_here":
@@ -705,5 +1347,4 @@ def api_chat():
 
 # ═══════════════════════════════════════════════════════════════
 if __name__ == '__main__':
-    init_db()
-    app.run(debug=True, port=5000)
\ No newline at end of file
+    create_app().run(debug=True, port=5000)
\ No newline at end of file
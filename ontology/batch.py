@@ -0,0 +1,193 @@
+"""
+Skoring batch jadwal upacara (offline, paralel antar-proses).
+
+Masukan CSV atau NDJSON berisi konteks (yadnya, upacara, pura, tahap) — nilai boleh
+ditulis bebas spasi/kapital ("Dewa Yadnya" = "DewaYadnya");
+keluaran NDJSON satu baris per konteks, ditulis bertahap sesuai urutan masukan:
+kidung utama, kandidat teratas, dan daftar kidung per tahap (urut urutanTahap).
+
+Model & katalog dimuat sekali per worker dari snapshot terkompilasi
+(mmap, tanpa owlready2/sklearn) — snapshot dibuat dulu bila belum ada/usang.
+
+    python -m ontology.batch jadwal.csv -o hasil.ndjson
+    python -m ontology.batch jadwal.ndjson --workers 8 --chunk-size 128
+    cat jadwal.csv | python -m ontology.batch - --format csv --full
+"""
+import argparse
+import csv
+import json
+import os
+import subprocess
+import sys
+import time
+from multiprocessing import Pool
+
+import pandas as pd
+
+from ontology.query import recommend
+from ontology.snapshot import SNAPSHOT_PATH, KidungSnapshot, snapshot_is_current
+
+CONTEXT_FIELDS = ('yadnya', 'upacara', 'pura', 'tahap')
+DF_COLUMNS     = ['target', 'judul', 'yadnya', 'upacara', 'pura', 'tahap', 'makna', 'jenis_sekar']
+# Kolom per kidung di keluaran ringkas (tanpa --full)
+SLIM_FIELDS    = ('judul', 'tahap', 'urutan_tahap', 'pura', 'jenis_sekar', 'has_audio', 'url_audio')
+
+_worker = {}
+
+
+class InvalidRow(ValueError):
+    """Baris masukan yang tidak bisa dibaca — dilaporkan sebagai baris error, proses jalan terus."""
+
+
+def _norm(value):
+    return ''.join(str(value).split()).replace('_', '').lower()
+
+
+def canonical_values(df):
+    """Per kolom konteks: bentuk ternormalisasi → nilai katalog ("Dewa Yadnya" → "DewaYadnya")."""
+    return {f: {_norm(v): v for v in df[f].astype(str).unique()} for f in CONTEXT_FIELDS}
+
+
+def _init_worker(path, full):
+    snap = KidungSnapshot(path)
+    _worker['snapshot']  = snap
+    _worker['df']        = pd.DataFrame(snap.rows, columns=DF_COLUMNS)
+    _worker['canonical'] = canonical_values(_worker['df'])
+    _worker['full']      = full
+
+
+def score_context(context, snap, df, full=False, canonical=None):
+    """Satu baris masukan → dict keluaran (logika sama dengan /predict)."""
+    data = {k: v for k, v in context.items() if k in CONTEXT_FIELDS and v not in (None, '')}
+    if canonical:
+        data = {k: canonical[k].get(_norm(v), v) for k, v in data.items()}
+    result = recommend(snap.predictor, df, data, snap.details, snap.playlists)
+    if result['status'] != 'success':
+        return {'status': result['status'], 'konteks': result['konteks']}
+    per_tahap = result['kidung_per_tahap']
+    if not full:
+        per_tahap = [{f: k.get(f) for f in SLIM_FIELDS} for k in per_tahap]
+    return {
+        'status':           'success',
+        'konteks':          result['konteks'],
+        'judul':            result['judul'],
+        'top_candidates':   result['top_candidates'],
+        'mode_semua_tahap': result['mode_semua_tahap'],
+        'total_ditemukan':  result['total_ditemukan'],
+        'kidung_per_tahap': per_tahap,
+    }
+
+
+def _score_chunk(chunk):
+    """Dijalankan di worker: [(no_baris, konteks)] → [baris NDJSON]."""
+    snap, df, full = _worker['snapshot'], _worker['df'], _worker['full']
+    lines = []
+    for row_no, context in chunk:
+        if isinstance(context, InvalidRow):
+            lines.append(json.dumps({'row': row_no, 'status': 'error', 'message': str(context), 'konteks': None},
+                                    ensure_ascii=False))
+            continue
+        try:
+            out = score_context(context, snap, df, full, _worker['canonical'])
+        except Exception as e:
+            out = {'status': 'error', 'message': str(e), 'konteks': context}
+        lines.append(json.dumps({'row': row_no, **out}, ensure_ascii=False))
+    return lines
+
+
+def read_contexts(stream, fmt):
+    """
+    Baca konteks dari CSV (header = nama kolom) atau NDJSON (satu objek per baris).
+    Baris NDJSON yang rusak menghasilkan InvalidRow di posisinya, bukan menghentikan pembacaan.
+    """
+    if fmt == 'csv':
+        for row in csv.DictReader(stream):
+            yield {(k or '').strip().lower(): (v or '').strip() for k, v in row.items()}
+    else:
+        for line in stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                context = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield InvalidRow(f"JSON tidak valid: {e}")
+                continue
+            yield context if isinstance(context, dict) else InvalidRow("Baris harus berupa objek JSON.")
+
+
+def chunked(rows, size):
+    chunk = []
+    for i, row in enumerate(rows, start=1):
+        chunk.append((i, row))
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def ensure_snapshot(path=SNAPSHOT_PATH):
+    """Kompilasi snapshot di subprocess bila belum ada atau tertinggal dari kidung.owx."""
+    if path == SNAPSHOT_PATH and not snapshot_is_current():
+        print("🔄 Snapshot belum ada/usang — mengompilasi...", file=sys.stderr)
+        subprocess.run([sys.executable, '-m', 'ontology.snapshot'],
+                       cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                       stdout=sys.stderr, check=True)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Snapshot {path} tidak ditemukan!")
+
+
+def run(rows, out, workers=None, chunk_size=64, full=False, path=SNAPSHOT_PATH):
+    """Skor semua konteks dan tulis NDJSON ke `out`. Mengembalikan jumlah baris."""
+    workers = workers or os.cpu_count() or 1
+    chunks  = chunked(rows, chunk_size)
+    total   = 0
+    if workers == 1:
+        _init_worker(path, full)
+        results = map(_score_chunk, chunks)
+        for lines in results:
+            out.write('\n'.join(lines) + '\n')
+            total += len(lines)
+        return total
+    with Pool(workers, initializer=_init_worker, initargs=(path, full)) as pool:
+        # imap menjaga urutan masukan; setiap chunk ditulis begitu selesai
+        for lines in pool.imap(_score_chunk, chunks):
+            out.write('\n'.join(lines) + '\n')
+            total += len(lines)
+    return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m ontology.batch',
+                                     description='Skoring batch konteks upacara → rekomendasi kidung (NDJSON).')
+    parser.add_argument('input', help="file CSV/NDJSON, atau '-' untuk stdin")
+    parser.add_argument('-o', '--output', default='-', help="file keluaran NDJSON (default stdout)")
+    parser.add_argument('--format', choices=('csv', 'ndjson'), help="format masukan (default dari ekstensi)")
+    parser.add_argument('--workers', type=int, default=None, help="jumlah proses (default jumlah core)")
+    parser.add_argument('--chunk-size', type=int, default=64, help="konteks per tugas worker")
+    parser.add_argument('--full', action='store_true', help="sertakan detail lengkap (teks, makna) tiap kidung")
+    args = parser.parse_args(argv)
+
+    fmt = args.format or ('csv' if args.input.lower().endswith('.csv') else 'ndjson')
+    if args.input == '-' and not args.format:
+        parser.error("--format wajib diisi bila membaca dari stdin")
+
+    ensure_snapshot()
+    t0  = time.time()
+    src = sys.stdin if args.input == '-' else open(args.input, encoding='utf-8-sig', newline='')
+    dst = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    try:
+        total = run(read_contexts(src, fmt), dst, args.workers, max(1, args.chunk_size), args.full)
+    finally:
+        if src is not sys.stdin:
+            src.close()
+        if dst is not sys.stdout:
+            dst.close()
+    elapsed = time.time() - t0
+    print(f"✅ {total} konteks diskor dalam {elapsed:.2f} detik "
+          f"({total / elapsed if elapsed else 0:.0f} konteks/detik)", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
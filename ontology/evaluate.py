@@ -0,0 +1,199 @@
+"""
+Evaluasi mesin rekomendasi (ontology.rules.ENGINES) pada ontologi asli dan katalog sintetis.
+
+Per mesin & dataset dilaporkan:
+  train_ms    waktu train (median beberapa ulangan)
+  mem_kb      memori yang tertahan setelah train (tracemalloc), puncak dalam kurung
+  call_us     latensi predict() per panggilan
+  batch_us    latensi predict_batch() dibagi jumlah konteks
+  agree       % konteks dengan prediksi sama persis seperti mesin acuan (yang pertama)
+  loo_agree   leave-one-out: % kidung yang ditahan dengan prediksi sama seperti mesin acuan
+  loo_rel     leave-one-out: % prediksi yang yadnya+upacara-nya sama dengan kidung yang ditahan
+
+    python -m ontology.evaluate
+    python -m ontology.evaluate --engines tree,exact --synthetic 1000,10000 --loo 200 --json
+"""
+import argparse
+import contextlib
+import io
+import json
+import random
+import statistics
+import time
+import tracemalloc
+
+import pandas as pd
+
+from ontology.rules import ENGINES, create_engine
+
+FEATURES = ['yadnya', 'upacara', 'pura']
+COLUMNS  = ['target', 'judul', 'yadnya', 'upacara', 'pura', 'tahap', 'makna', 'jenis_sekar']
+
+
+def synthetic_catalog(n, seed=0):
+    """
+    DataFrame katalog sintetis berbentuk sama dengan get_kidung_dataframe():
+    5 yadnya, upacara per yadnya & pura bertambah seiring n, satu individu per baris.
+    """
+    rng     = random.Random(seed)
+    yadnya  = ['DewaYadnya', 'PitraYadnya', 'ManusaYadnya', 'BhutaYadnya', 'RsiYadnya']
+    per_y   = max(3, int(n ** 0.5 / 2))
+    upacara = {y: [f"Upacara{y[:4]}{i}" for i in range(per_y)] for y in yadnya}
+    pura    = [f"Pura{i}" for i in range(max(5, int(n ** 0.5)))]
+    tahap   = ['AwalRangkaianUpacara', 'PuncakUpacara', 'AkhirRangkaianUpacara']
+    rows = []
+    for i in range(n):
+        y = rng.choice(yadnya)
+        rows.append({
+            'target':      f"Kidung_Sintetis_{i}",
+            'judul':       f"Kidung Sintetis {i}",
+            'yadnya':      y,
+            'upacara':     rng.choice(upacara[y]),
+            'pura':        rng.choice(pura) if rng.random() > 0.2 else 'None',
+            'tahap':       rng.choice(tahap),
+            'makna':       'None',
+            'jenis_sekar': 'None',
+        })
+    return pd.DataFrame(rows, columns=COLUMNS)
+
+
+def sample_queries(df, n, seed=0):
+    """Konteks uji: relasi kidung yang ada, sebagian dilepas (pura/upacara) atau diganti nilai asing."""
+    rng     = random.Random(seed)
+    records = df[FEATURES].astype(str).to_dict(orient='records')
+    queries = []
+    for _ in range(n):
+        q    = dict(rng.choice(records))
+        roll = rng.random()
+        if roll < 0.25:
+            q['pura'] = 'None'
+        elif roll < 0.4:
+            q['upacara'], q['pura'] = 'None', 'None'
+        elif roll < 0.5:
+            q[rng.choice(FEATURES)] = 'TidakDikenal'
+        queries.append(q)
+    return queries
+
+
+def _train(name, df):
+    engine = create_engine(name)
+    with contextlib.redirect_stdout(io.StringIO()):   # train() mencetak ringkasan
+        engine.train(df)
+    return engine
+
+
+def measure_engine(name, df, queries, repeats=3):
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        _train(name, df)
+        times.append((time.perf_counter() - t0) * 1000)
+
+    tracemalloc.start()
+    base   = tracemalloc.take_snapshot()
+    engine = _train(name, df)
+    retained = sum(s.size_diff for s in tracemalloc.take_snapshot().compare_to(base, 'filename'))
+    _, peak  = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    t0 = time.perf_counter()
+    single = [engine.predict(q) for q in queries]
+    call_us = (time.perf_counter() - t0) * 1e6 / len(queries)
+
+    t0 = time.perf_counter()
+    batch = engine.predict_batch(queries)
+    batch_us = (time.perf_counter() - t0) * 1e6 / len(queries)
+
+    if batch != single:
+        raise AssertionError(f"predict_batch() mesin '{name}' tidak sama dengan predict()")
+    return engine, single, {
+        'train_ms': round(statistics.median(times), 2),
+        'mem_kb':   round(retained / 1024, 1),
+        'peak_kb':  round(peak / 1024, 1),
+        'call_us':  round(call_us, 1),
+        'batch_us': round(batch_us, 1),
+    }
+
+
+def leave_one_out(names, df, n, seed=0):
+    """Latih ulang tanpa satu kidung, lalu prediksi konteks kidung tersebut. {nama: [prediksi]}"""
+    rng   = random.Random(seed)
+    idx   = rng.sample(range(len(df)), min(n, len(df)))
+    preds = {name: [] for name in names}
+    for i in idx:
+        train = df.drop(df.index[i])
+        query = df.iloc[i][FEATURES].astype(str).to_dict()
+        for name in names:
+            preds[name].append(_train(name, train).predict(query))
+    return df.iloc[idx], preds
+
+
+def evaluate(df, label, names, n_queries=500, n_loo=100, repeats=3):
+    queries = sample_queries(df, n_queries)
+    ctx     = df.set_index('target')[['yadnya', 'upacara']].astype(str).to_dict(orient='index')
+    held, loo = leave_one_out(names, df, n_loo)
+    held_ctx  = held[['yadnya', 'upacara']].astype(str).to_dict(orient='records')
+
+    results, reference, loo_ref = [], None, loo[names[0]]
+    for name in names:
+        _, preds, row = measure_engine(name, df, queries, repeats)
+        reference = reference or preds
+        row.update({
+            'dataset':   label,
+            'rows':      len(df),
+            'engine':    name,
+            'agree':     round(100 * sum(a == b for a, b in zip(preds, reference)) / len(preds), 1),
+            'loo_agree': round(100 * sum(a == b for a, b in zip(loo[name], loo_ref)) / max(1, len(loo_ref)), 1),
+            'loo_rel':   round(100 * sum(ctx.get(p) == c for p, c in zip(loo[name], held_ctx)) / max(1, len(held_ctx)), 1),
+        })
+        results.append(row)
+    return results
+
+
+def print_table(results):
+    cols = ['dataset', 'rows', 'engine', 'train_ms', 'mem_kb', 'peak_kb', 'call_us', 'batch_us',
+            'agree', 'loo_agree', 'loo_rel']
+    widths = {c: max(len(c), *(len(str(r[c])) for r in results)) for c in cols}
+    print('  '.join(c.ljust(widths[c]) for c in cols))
+    for r in results:
+        print('  '.join(str(r[c]).ljust(widths[c]) for c in cols))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m ontology.evaluate',
+                                     description='Bandingkan akurasi & latensi mesin rekomendasi.')
+    parser.add_argument('--engines', default=','.join(ENGINES),
+                        help=f"daftar mesin, yang pertama jadi acuan (default {','.join(ENGINES)})")
+    parser.add_argument('--synthetic', default='1000,10000', help="ukuran katalog sintetis, '' untuk melewati")
+    parser.add_argument('--queries', type=int, default=500, help="jumlah konteks uji latensi/kesepakatan")
+    parser.add_argument('--loo', type=int, default=100, help="jumlah kidung yang diuji leave-one-out")
+    parser.add_argument('--repeats', type=int, default=3, help="ulangan pengukuran waktu train")
+    parser.add_argument('--skip-real', action='store_true', help="lewati ontologi kidung.owx")
+    parser.add_argument('--json', action='store_true', help="keluaran JSON")
+    args = parser.parse_args(argv)
+
+    names = [e.strip() for e in args.engines.split(',') if e.strip()]
+    for name in names:
+        if name not in ENGINES:
+            parser.error(f"mesin '{name}' tidak dikenal (pilihan: {', '.join(ENGINES)})")
+
+    datasets = []
+    if not args.skip_real:
+        from ontology.loader import load_ontology, get_kidung_dataframe
+        with contextlib.redirect_stdout(io.StringIO()):
+            datasets.append(('ontologi', get_kidung_dataframe(load_ontology())))
+    for size in [int(s) for s in args.synthetic.split(',') if s.strip()]:
+        datasets.append((f"sintetis-{size}", synthetic_catalog(size)))
+
+    results = []
+    for label, df in datasets:
+        results += evaluate(df, label, names, args.queries, args.loo, args.repeats)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_table(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,5 @@
-from owlready2 import *
 import pandas as pd
+import hashlib
 import os
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -8,12 +8,19 @@ ONTO_PATH = os.path.join(BASE_DIR, "kidung.owx")
 def load_ontology():
     if not os.path.exists(ONTO_PATH):
         raise FileNotFoundError(f"File {ONTO_PATH} tidak ditemukan!")
+    # Import di sini supaya proses baca-saja (snapshot) tidak pernah memuat owlready2
+    from owlready2 import get_ontology
     try:
         onto = get_ontology(f"file://{ONTO_PATH}").load()
         return onto
     except Exception as e:
         raise Exception(f"Gagal memuat ontology: {str(e)}")
 
+def get_ontology_version(path=ONTO_PATH):
+    """Sidik jari isi file ontologi — hanya berubah bila katalog berubah."""
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()[:12]
+
 def get_v(prop):
     """Ambil nilai object property sebagai string bersih."""
     try:
@@ -0,0 +1,78 @@
+PLAYLIST_FIELDS = ('yadnya', 'upacara', 'tahap', 'pura')
+
+
+def _key(value):
+    """Bentuk pembanding nilai konteks (sama dengan filter strip().lower() di get_kidung_by_context)."""
+    value = str(value).strip().lower() if value is not None else ''
+    return '' if value == 'none' else value
+
+
+def get_urutan_tahap(onto):
+    """urutanTahap per individu dalam satu lintasan instance (99 bila kosong, seperti build_kidung_detail)."""
+    urutan = {}
+    try:
+        for k in onto.KidungPancaYadnya.instances():
+            try:
+                urutan[k.name] = int(k.urutanTahap[0]) if k.urutanTahap else 99
+            except Exception:
+                urutan[k.name] = 99
+    except AttributeError:
+        pass
+    return urutan
+
+
+class CeremonyPlaylists:
+    """
+    Playlist kidung per konteks upacara (yadnya, upacara, tahap, pura), sudah urut urutanTahap
+    dan sudah menerapkan aturan fallback get_kidung_by_context:
+      - tahap yang tidak punya kidung diabaikan, begitu juga pura
+      - bila yadnya+upacara kosong, seluruh kidung yadnya tersebut
+    Dibangun sekali per rebuild katalog; get() cukup beberapa lookup dict.
+    """
+
+    def __init__(self):
+        self.table = {}
+
+    def build(self, df, urutan):
+        """urutan: {target: urutan_tahap} — target tanpa detail tidak masuk playlist."""
+        self.table = {}
+        if df.empty:
+            return self
+        groups = {}
+        for i, row in enumerate(df[['target', *PLAYLIST_FIELDS]].to_dict(orient='records')):
+            if row['target'] not in urutan:
+                continue
+            y, u, t = _key(row['yadnya']), _key(row['upacara']), _key(row['tahap'])
+            item = (urutan[row['target']], i, row['target'], _key(row['pura']))
+            for key in {(yk, uk, tk) for yk in (y, '') for uk in (u, '') for tk in (t, '')}:
+                groups.setdefault(key, []).append(item)
+
+        for (y, u, t), items in groups.items():
+            items.sort()
+            self.table[(y, u, t, '')] = [target for _, _, target, _ in items]
+            for _, _, target, p in items:
+                if p:
+                    self.table.setdefault((y, u, t, p), []).append(target)
+        return self
+
+    def get(self, yadnya=None, upacara=None, pura=None, tahap=None):
+        """Daftar target berurutan untuk konteks; tahap None/"" = semua tahap."""
+        y, u, t, p = _key(yadnya), _key(upacara), _key(tahap), _key(pura)
+        if (y, u, '', '') not in self.table:
+            return self.table.get((y, '', '', ''), []) if y else []
+        if (y, u, t, '') not in self.table:
+            t = ''
+        return self.table.get((y, u, t, p)) or self.table[(y, u, t, '')]
+
+    def __len__(self):
+        return len(self.table)
+
+    # ─── SERIALISASI (header snapshot) ──────────────────────────
+    def export(self):
+        return [[*key, targets] for key, targets in self.table.items()]
+
+    @classmethod
+    def from_table(cls, rows):
+        playlists = cls()
+        playlists.table = {tuple(row[:4]): row[4] for row in rows}
+        return playlists
@@ -1,3 +1,6 @@
+SEMUA_TAHAP = "── Semua Tahap (Panduan Lengkap) ──"
+
+
 def get_platform(url):
     if not url:
         return None
@@ -36,7 +39,38 @@ def get_kidung_detail(onto, nama_individu):
         kidung = onto.search_one(iri=f"*{nama_individu}")
         if not kidung:
             return None
+        return build_kidung_detail(kidung, nama_individu)
+    except Exception as e:
+        print(f"Error get_kidung_detail '{nama_individu}': {e}")
+        return None
 
+
+def get_kidung_details(onto, nama_list):
+    """
+    Detail banyak kidung sekaligus: satu kali lintasan atas instance
+    KidungPancaYadnya, bukan satu search_one per nama.
+    Mengembalikan dict {nama: detail}; nama yang tidak ditemukan dilewati.
+    """
+    wanted  = set(nama_list)
+    results = {}
+    if not wanted:
+        return results
+    try:
+        for kidung in onto.KidungPancaYadnya.instances():
+            if kidung.name in wanted:
+                detail = build_kidung_detail(kidung, kidung.name)
+                if detail:
+                    results[kidung.name] = detail
+                if len(results) == len(wanted):
+                    break
+    except Exception as e:
+        print(f"Error get_kidung_details: {e}")
+    return results
+
+
+def build_kidung_detail(kidung, nama_individu):
+    """Susun dict detail dari individual kidung yang sudah ditemukan."""
+    try:
         def s(prop_name):
             """Ambil data property string dengan aman — tidak error walau property belum ada di ontologi."""
             try:
@@ -114,11 +148,15 @@ def get_kidung_detail(onto, nama_individu):
             "has_audio":             embed_url is not None,
         }
     except Exception as e:
-        print(f"Error get_kidung_detail '{nama_individu}': {e}")
+        print(f"Error build_kidung_detail '{nama_individu}': {e}")
         return None
 
 
-def get_kidung_by_context(onto, df, yadnya=None, upacara=None, pura=None, tahap_filter=None):
+def get_kidung_by_context(onto, df, yadnya=None, upacara=None, pura=None, tahap_filter=None, lookup=None):
+    """
+    lookup: fungsi list-nama → {nama: detail}. Default satu lintasan ontologi
+    (get_kidung_details); mode baca-saja memakai snapshot.
+    """
     try:
         tmp = df.copy()
 
@@ -140,15 +178,139 @@ def get_kidung_by_context(onto, df, yadnya=None, upacara=None, pura=None, tahap_
         if tmp.empty and yadnya:
             tmp = df[df['yadnya'].str.strip().str.lower() == yadnya.strip().lower()]
 
-        results = []
-        for _, row in tmp.iterrows():
-            detail = get_kidung_detail(onto, row['target'])
-            if detail:
-                results.append(detail)
+        targets = tmp['target'].tolist()
+        details = lookup(targets) if lookup else get_kidung_details(onto, targets)
+        results = [details[t] for t in targets if t in details]
 
         results.sort(key=lambda x: x.get('urutan_tahap', 99))
         return results
 
     except Exception as e:
         print(f"Error get_kidung_by_context: {e}")
-        return []
\ No newline at end of file
+        return []
+
+
+def recommend(engine, df, data, lookup, playlists=None):
+    """
+    Rekomendasi lengkap untuk satu konteks kuesioner — dipakai /predict dan skoring batch.
+    engine: KidungEngine (ontology.rules) atau SnapshotPredictor; lookup: fungsi list-nama → {nama: detail}.
+    playlists: CeremonyPlaylists (opsional) — daftar per tahap jadi lookup tabel, tanpa filter df.
+    Mengembalikan dict respons (status "success" atau "fallback").
+    """
+    cleaned     = {k: str(v).strip() for k, v in data.items()}
+    tahap_pilih = cleaned.get('tahap', '')
+    mode_semua  = (not tahap_pilih or tahap_pilih in ('None', SEMUA_TAHAP))
+
+    nama = engine.predict({
+        k: v for k, v in cleaned.items()
+        if k != 'tahap' or not mode_semua
+    })
+
+    if playlists is not None:
+        targets   = playlists.get(cleaned.get('yadnya'), cleaned.get('upacara'), cleaned.get('pura'),
+                                  None if mode_semua else tahap_pilih)
+        details   = lookup(targets)
+        per_tahap = [details[t] for t in targets if t in details]
+    else:
+        per_tahap = get_kidung_by_context(
+            None, df,
+            lookup       = lookup,
+            yadnya       = cleaned.get('yadnya'),
+            upacara      = cleaned.get('upacara'),
+            pura         = cleaned.get('pura'),
+            tahap_filter = None if mode_semua else tahap_pilih,
+        )
+
+    if not per_tahap:
+        return {
+            "status":  "fallback",
+            "message": (
+                "Kidung untuk konteks ini belum tersedia dalam basis pengetahuan. "
+                "Coba pilih konteks yang lebih umum atau konsultasikan dengan pemangku setempat."
+            ),
+            "konteks": cleaned,
+        }
+
+    detail_utama = lookup([nama]).get(nama) if nama else None
+    if not detail_utama:
+        detail_utama = per_tahap[0]
+
+    explanation    = engine.build_explanation(cleaned, detail_utama.get('judul', ''))
+    top_candidates = engine.get_top_candidates(
+        {k: v for k, v in cleaned.items() if k in ['yadnya', 'upacara', 'pura']},
+        n=3
+    )
+
+    return {
+        "status":           "success",
+        "judul":            detail_utama.get('judul', ''),
+        "teks":             detail_utama.get('teks', '-'),
+        "makna":            detail_utama.get('makna_mendalam', '-'),
+        "bahasa":           detail_utama.get('bahasa', '-'),
+        **detail_utama,
+        "kidung_per_tahap": per_tahap,
+        "explanation":      explanation,
+        "top_candidates":   top_candidates,
+        "total_ditemukan":  len(per_tahap),
+        "mode_semua_tahap": mode_semua,
+        "konteks":          cleaned,
+    }
+
+
+def get_reference_options(onto):
+    """Daftar individual _Ref per kelas (upacara/tahap/pura/makna) untuk form admin."""
+    def get_individuals(class_name):
+        cls = onto.search_one(iri=f"*{class_name}")
+        if not cls:
+            return []
+        return sorted([
+            ind.name.replace("_Ref", "").replace("_", " ").strip()
+            for ind in cls.instances()
+            if ind.name.endswith("_Ref")
+        ])
+
+    return {
+        "upacara": get_individuals("UpacaraPancaYadnya"),
+        "tahap":   get_individuals("TahapPelaksanaanUpacara"),
+        "pura":    get_individuals("PuraTempatPelaksanaan"),
+        "makna":   get_individuals("MaknaKidung"),
+    }
+
+
+def build_explanation(input_dict):
+    """Kalimat penjelasan rekomendasi dari konteks yang dipilih pengguna."""
+    yadnya  = str(input_dict.get('yadnya', '')).replace('_',' ')
+    upacara = str(input_dict.get('upacara', '')).replace('_',' ')
+    pura    = str(input_dict.get('pura', '')).replace('_',' ')
+    tahap   = str(input_dict.get('tahap', '')).replace('_',' ')
+
+    alasan = []
+    if yadnya  and yadnya  != 'None': alasan.append(f"merupakan bagian dari <strong>{yadnya}</strong>")
+    if upacara and upacara != 'None': alasan.append(f"digunakan pada upacara <strong>{upacara}</strong>")
+    if tahap   and tahap not in ('None', '', SEMUA_TAHAP):
+        alasan.append(f"dinyanyikan pada tahap <strong>{tahap}</strong>")
+    if pura    and pura not in ('None', ''):
+        alasan.append(f"dilaksanakan di <strong>{pura}</strong>")
+
+    if alasan:
+        return (f"Kidung ini direkomendasikan karena {', '.join(alasan)}, "
+                f"sesuai dengan relasi yang tersimpan dalam basis pengetahuan ontologi Kidung Panca Yadnya.")
+    return "Kidung ini direkomendasikan berdasarkan kesesuaian konteks upacara yang dipilih."
+
+
+def build_option_graph(df, features=('yadnya', 'upacara', 'tahap', 'pura')):
+    """
+    Graf opsi kuesioner bersarang: yadnya → upacara → tahap → pura → [target].
+    Nilai kosong tetap disimpan (sebagai "None") supaya mode "Semua Tahap"
+    di klien bisa menggabungkan seluruh cabang seperti filter di server.
+    """
+    graph = {}
+    if df.empty:
+        return graph
+    for row in df[list(features) + ['target']].itertuples(index=False):
+        node = graph
+        for feat in features[:-1]:
+            node = node.setdefault(str(getattr(row, feat)).strip() or "None", {})
+        leaf = node.setdefault(str(getattr(row, features[-1])).strip() or "None", [])
+        leaf.append(row.target)
+    return graph
\ No newline at end of file
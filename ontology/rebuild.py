@@ -0,0 +1,95 @@
+import threading
+import time
+import traceback
+
+
+class DebouncedRebuilder:
+    """
+    Worker latar belakang untuk rebuild DataFrame/model/indeks setelah edit admin.
+    Mutasi yang datang dalam jendela debounce digabung menjadi satu rebuild;
+    max_delay mencegah rebuild tertunda terus bila edit tidak pernah berhenti.
+    Selama rebuild berjalan, request tetap dilayani dari state sebelumnya.
+    """
+
+    def __init__(self, rebuild_fn, debounce=2.0, max_delay=10.0):
+        self.rebuild_fn = rebuild_fn
+        self.debounce   = debounce
+        self.max_delay  = max_delay
+        self._cond      = threading.Condition()
+        self._pending   = set()
+        self._mutations = 0
+        self._first_at  = None
+        self._last_at   = None
+        self._thread    = None
+        self._running   = False
+        self.stats = {
+            'rebuilds':      0,
+            'mutations':     0,
+            'last_started':  None,
+            'last_finished': None,
+            'last_duration': None,
+            'last_error':    None,
+            'last_targets':  [],
+        }
+
+    def submit(self, targets):
+        """Catat kidung yang berubah; rebuild dijalankan setelah jendela debounce tenang."""
+        with self._cond:
+            now = time.time()
+            self._pending.update(targets)
+            self._mutations += 1
+            self.stats['mutations'] += 1
+            self._first_at = self._first_at or now
+            self._last_at  = now
+            if self._thread is None or not self._thread.is_alive():
+                # Thread dibuat saat dibutuhkan — aman untuk master gunicorn --preload
+                self._thread = threading.Thread(target=self._loop, name='sarikidung-rebuild', daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def status(self):
+        with self._cond:
+            state = 'rebuilding' if self._running else ('pending' if self._mutations else 'idle')
+            return {
+                'state':           state,
+                'queue_depth':     self._mutations,
+                'pending_targets': sorted(self._pending),
+                **self.stats,
+            }
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while not self._mutations:
+                    self._cond.wait()
+                # Tunggu sampai tidak ada mutasi baru selama `debounce` detik (maks `max_delay`)
+                while True:
+                    now  = time.time()
+                    wait = min(self._last_at + self.debounce, self._first_at + self.max_delay) - now
+                    if wait <= 0:
+                        break
+                    self._cond.wait(wait)
+                changed = set(self._pending)
+                self._pending.clear()
+                self._mutations = 0
+                self._first_at  = None
+                self._running   = True
+                self.stats['last_started'] = time.time()
+
+            error = None
+            try:
+                self.rebuild_fn(changed)
+            except Exception as e:
+                traceback.print_exc()
+                error = str(e)
+
+            with self._cond:
+                self._running = False
+                finished = time.time()
+                self.stats.update({
+                    'rebuilds':      self.stats['rebuilds'] + 1,
+                    'last_finished': finished,
+                    'last_duration': round(finished - self.stats['last_started'], 3),
+                    'last_error':    error,
+                    'last_targets':  sorted(changed),
+                })
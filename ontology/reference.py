@@ -0,0 +1,124 @@
+import re
+
+from ontology.loader import get_s
+
+# Field form admin → kelas individual _Ref di ontologi
+REF_CLASSES = {
+    'yadnya':      'JenisYadnya',
+    'jenis_sekar': 'JenisKidung',
+    'upacara':     'UpacaraPancaYadnya',
+    'tahap':       'TahapPelaksanaanUpacara',
+    'pura':        'PuraTempatPelaksanaan',
+    'makna':       'MaknaKidung',
+}
+# Label pilihan form yang berbeda dari nama individual
+FORM_ALIASES = {
+    'jenis_sekar': {'Sekar Alit': 'KidungSekarAlit', 'Sekar Madya': 'KidungSekarMadya', 'Sekar Agung': 'KidungWargasari'},
+}
+# Kata pembuka judul yang tidak membedakan kidung ("Kidung Nanginin Sawa" ≈ "Nanginin Sawa")
+JUDUL_PREFIXES = ('pupuh', 'kidung', 'wirama', 'sekar', 'tembang', 'geguritan')
+
+
+def normalize_label(text):
+    """'Pura Desa' / 'PuraDesa_Ref' / 'pura_desa' → 'puradesa'."""
+    text = re.sub(r'_Ref$', '', str(text).strip())
+    return re.sub(r'[^0-9a-z]', '', text.lower())
+
+
+def judul_key(judul):
+    """Judul untuk deteksi duplikat persis: huruf kecil, spasi dirapikan."""
+    return ' '.join(str(judul).casefold().split())
+
+
+def judul_near_key(judul):
+    """Judul untuk deteksi mirip: tanpa tanda baca & kata pembuka (pupuh/kidung/wirama/...)."""
+    words = re.findall(r'[0-9a-z]+', str(judul).casefold())
+    while words and words[0] in JUDUL_PREFIXES:
+        words = words[1:]
+    return ''.join(words)
+
+
+class ReferenceIndex:
+    """
+    Indeks in-memory untuk validasi admin, dibangun sekali per rebuild katalog:
+      - individual _Ref per kelas & label ternormalisasi (resolusi relasi form → individual)
+      - individual KidungPancaYadnya per nama, dan per judul (duplikat persis & mirip)
+      - semua nama entitas (nama individual baru yang unik)
+    Rute admin memperbarui indeks langsung setelah menulis, sebelum rebuild latar belakang.
+    """
+
+    def __init__(self):
+        self.by_class   = {}
+        self.by_label   = {}
+        self.kidung     = {}
+        self.names      = set()
+        self.judul      = {}
+        self.judul_near = {}
+        self.titles     = {}
+
+    def build(self, onto):
+        for cls in onto.classes():
+            self.names.add(cls.name)
+        for prop in onto.properties():
+            self.names.add(prop.name)
+        for ind in onto.individuals():
+            self.names.add(ind.name)
+            if ind.name.endswith('_Ref'):
+                self.add_reference(ind)
+        try:
+            for k in onto.KidungPancaYadnya.instances():
+                self.add_kidung(k, get_s(k.judulKidung) or k.name.replace('_', ' '))
+        except AttributeError:
+            pass
+        return self
+
+    # ─── RELASI _Ref ────────────────────────────────────────────
+    def add_reference(self, ind):
+        label = normalize_label(ind.name)
+        for cls in ind.is_a:
+            name = getattr(cls, 'name', None)
+            if name:
+                self.by_class.setdefault(name, {})[label] = ind
+        self.by_label.setdefault(label, ind)
+        self.names.add(ind.name)
+
+    def resolve(self, field, value):
+        """Individual _Ref untuk nilai form (kelas yang sesuai dulu, lalu label apa pun), atau None."""
+        value = FORM_ALIASES.get(field, {}).get(value, value)
+        label = normalize_label(value)
+        if not label:
+            return None
+        return self.by_class.get(REF_CLASSES.get(field), {}).get(label) or self.by_label.get(label)
+
+    # ─── KIDUNG ─────────────────────────────────────────────────
+    def add_kidung(self, kidung, judul):
+        self.remove_kidung(kidung.name)
+        self.kidung[kidung.name] = kidung
+        self.titles[kidung.name] = judul
+        self.names.add(kidung.name)
+        self.judul.setdefault(judul_key(judul), set()).add(kidung.name)
+        self.judul_near.setdefault(judul_near_key(judul), set()).add(kidung.name)
+
+    def remove_kidung(self, name):
+        judul = self.titles.pop(name, None)
+        self.kidung.pop(name, None)
+        if judul is None:
+            return
+        self.names.discard(name)
+        self.judul.get(judul_key(judul), set()).discard(name)
+        self.judul_near.get(judul_near_key(judul), set()).discard(name)
+
+    def unique_name(self, base):
+        """Nama individual yang belum dipakai entitas mana pun: base, base_2, base_3, ..."""
+        name, i = base, 1
+        while name in self.names:
+            i += 1
+            name = f"{base}_{i}"
+        return name
+
+    def find_duplicates(self, judul, exclude=None):
+        """(duplikat persis, mirip) — masing-masing list judul kidung lain, exclude = nama yang diedit."""
+        near_key = judul_near_key(judul)
+        exact = self.judul.get(judul_key(judul), set()) - {exclude}
+        near  = (self.judul_near.get(near_key, set()) if near_key else set()) - exact - {exclude}
+        return sorted(self.titles[n] for n in exact), sorted(self.titles[n] for n in near)
@@ -0,0 +1,182 @@
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import TfidfVectorizer
+from ontology.loader import get_s
+
+# Relasi ontologi yang dibandingkan antar kidung
+RELATION_COLS = ['yadnya', 'upacara', 'tahap', 'pura', 'jenis_sekar']
+
+
+def get_kidung_texts(onto, targets=None):
+    """Ambil teksKidung + maknaMendalam per individu dalam satu lintasan instance."""
+    wanted = set(targets) if targets is not None else None
+    texts  = {}
+    try:
+        for k in onto.KidungPancaYadnya.instances():
+            if wanted is None or k.name in wanted:
+                texts[k.name] = f"{get_s(k.teksKidung)} {get_s(k.maknaMendalam)}".strip()
+    except AttributeError:
+        pass
+    return texts
+
+
+class RelatedKidungIndex:
+    """
+    Tabel tetangga top-k untuk setiap KidungPancaYadnya.
+    Skor = (1 - text_weight) * porsi relasi yang sama (upacara/tahap/pura/yadnya/jenis_sekar)
+         + text_weight       * cosine TF-IDF atas teks & makna.
+    Dibangun sekali saat load; perubahan admin diterapkan per kidung lewat sync_target()
+    (kosakata TF-IDF tetap dari build terakhir).
+    """
+
+    def __init__(self, k=5, text_weight=0.5):
+        self.k           = k
+        self.text_weight = text_weight
+        self.targets     = []
+        self.pos         = {}
+        self.rows        = {}
+        self.rel_vocab   = {}
+        self.vectorizer  = None
+        self.R           = sp.csr_matrix((0, 0))
+        self.T           = sp.csr_matrix((0, 0))
+        self.neighbors   = {}
+
+    # ─── BUILD ──────────────────────────────────────────────────
+    def build(self, onto, df, texts=None):
+        """texts: hasil get_kidung_texts() yang sudah diambil (mis. di bawah lock ontologi)."""
+        if df.empty:
+            return self
+        records = df.to_dict(orient='records')
+        texts   = texts if texts is not None else get_kidung_texts(onto)
+
+        self.targets = [r['target'] for r in records]
+        self.pos     = {t: i for i, t in enumerate(self.targets)}
+        self.rows    = {r['target']: r for r in records}
+        rel_rows = [self._relation_row(r) for r in records]
+        for row in rel_rows:
+            row.resize((1, len(self.rel_vocab)))
+        self.R = sp.vstack(rel_rows).tocsr()
+
+        corpus = [texts.get(t, "") for t in self.targets]
+        try:
+            self.vectorizer = TfidfVectorizer(sublinear_tf=True)
+            self.T = self.vectorizer.fit_transform(corpus).tocsr()
+        except ValueError:
+            # semua teks kosong → tidak ada kosakata
+            self.vectorizer = None
+            self.T = sp.csr_matrix((len(records), 0))
+
+        S = self._score(self.R, self.T).tocsr()
+        for i, t in enumerate(self.targets):
+            self.neighbors[t] = self._top_k(S.getrow(i).toarray().ravel(), i)
+        print(f"✅ Related index siap: {len(self.targets)} kidung, top-{self.k}")
+        return self
+
+    # ─── QUERY ──────────────────────────────────────────────────
+    def related(self, target):
+        """List tetangga terurut: [{target, judul, skor, yadnya, upacara, tahap}]."""
+        out = []
+        for t, skor in self.neighbors.get(target, []):
+            row = self.rows.get(t, {})
+            out.append({
+                'target':  t,
+                'judul':   row.get('judul', t.replace('_', ' ')),
+                'skor':    round(skor, 3),
+                'yadnya':  row.get('yadnya', ''),
+                'upacara': row.get('upacara', ''),
+                'tahap':   row.get('tahap', ''),
+            })
+        return out
+
+    # ─── UPDATE INKREMENTAL ─────────────────────────────────────
+    def sync_target(self, onto, df, target, texts=None):
+        """Terapkan tambah/edit/hapus satu kidung tanpa menghitung ulang semua pasangan."""
+        match = df[df['target'] == target] if not df.empty else df
+        if match.empty:
+            self._remove(target)
+        else:
+            texts = texts if texts is not None else get_kidung_texts(onto, [target])
+            text  = texts.get(target, "")
+            self._upsert(match.iloc[0].to_dict(), text)
+
+    def _upsert(self, record, text):
+        target = record['target']
+        r = self._relation_row(record)
+        t = self._text_row(text)
+
+        if target in self.pos:
+            i = self.pos[target]
+            self.R.resize((len(self.targets), len(self.rel_vocab)))
+            self.R = sp.vstack([self.R[:i], r, self.R[i + 1:]]).tocsr()
+            self.T = sp.vstack([self.T[:i], t, self.T[i + 1:]]).tocsr()
+        else:
+            i = len(self.targets)
+            self.targets.append(target)
+            self.pos[target] = i
+            self.R.resize((i, len(self.rel_vocab)))
+            self.R = sp.vstack([self.R, r]).tocsr()
+            self.T = sp.vstack([self.T, t]).tocsr() if self.T.shape[0] else t
+        self.rows[target] = record
+
+        scores = self._row_scores(i)
+        self.neighbors[target] = self._top_k(scores, i)
+        for j, other in enumerate(self.targets):
+            if j == i:
+                continue
+            current = self.neighbors.get(other, [])
+            floor   = current[-1][1] if len(current) >= self.k else 0.0
+            if any(n == target for n, _ in current) or scores[j] > floor:
+                self.neighbors[other] = self._top_k(self._row_scores(j), j)
+
+    def _remove(self, target):
+        if target not in self.pos:
+            return
+        i = self.pos.pop(target)
+        self.targets.pop(i)
+        self.rows.pop(target, None)
+        self.neighbors.pop(target, None)
+        self.pos = {t: j for j, t in enumerate(self.targets)}
+        self.R = sp.vstack([self.R[:i], self.R[i + 1:]]).tocsr()
+        self.T = sp.vstack([self.T[:i], self.T[i + 1:]]).tocsr()
+        for j, other in enumerate(self.targets):
+            if any(n == target for n, _ in self.neighbors.get(other, [])):
+                self.neighbors[other] = self._top_k(self._row_scores(j), j)
+
+    # ─── INTERNAL ───────────────────────────────────────────────
+    def _relation_row(self, record):
+        cols = []
+        for col in RELATION_COLS:
+            val = str(record.get(col, 'None')).strip()
+            if val in ('None', '', 'nan'):
+                continue
+            key = f"{col}={val.lower()}"
+            if key not in self.rel_vocab:
+                self.rel_vocab[key] = len(self.rel_vocab)
+            cols.append(self.rel_vocab[key])
+        data = np.ones(len(cols), dtype=np.float32)
+        return sp.csr_matrix((data, ([0] * len(cols), cols)), shape=(1, len(self.rel_vocab)))
+
+    def _text_row(self, text):
+        if self.vectorizer is None:
+            return sp.csr_matrix((1, self.T.shape[1]))
+        return self.vectorizer.transform([text]).tocsr()
+
+    def _score(self, R, T, other_R=None, other_T=None):
+        other_R = R if other_R is None else other_R
+        other_T = T if other_T is None else other_T
+        rel = (R @ other_R.T) * (1.0 / len(RELATION_COLS))
+        txt = T @ other_T.T
+        return rel * (1 - self.text_weight) + txt * self.text_weight
+
+    def _row_scores(self, i):
+        return self._score(self.R[i], self.T[i], self.R, self.T).toarray().ravel()
+
+    def _top_k(self, scores, i):
+        scores = scores.copy()
+        scores[i] = -np.inf
+        if len(scores) <= 1:
+            return []
+        k   = min(self.k, len(scores) - 1)
+        idx = np.argpartition(-scores, k - 1)[:k]
+        idx = idx[np.argsort(-scores[idx], kind='stable')]
+        return [(self.targets[j], float(scores[j])) for j in idx if scores[j] > 0]
@@ -1,17 +1,86 @@
+import itertools
+import json
+import os
+from abc import ABC, abstractmethod
+from collections import Counter
+
 import pandas as pd
 import numpy as np
 from sklearn.tree import DecisionTreeClassifier
 from sklearn.preprocessing import LabelEncoder
+from ontology.query import build_explanation
+
+# Mesin yang dipakai app & kompilasi snapshot (lihat ENGINES di bawah)
+DEFAULT_ENGINE = os.getenv('SARIKIDUNG_ENGINE', 'tree')
+
+
+class KidungEngine(ABC):
+    """
+    Antarmuka mesin rekomendasi: train(df), lalu predict / get_top_candidates per konteks
+    {yadnya, upacara, pura}. Nilai kosong atau tidak dikenal diperlakukan sebagai 'None'.
+    export_lookup_table() mengompilasi mesin apa pun menjadi tabel untuk SnapshotPredictor.
+    """
+    name = None
+
+    def __init__(self):
+        # Fitur utama (tanpa tahap karena tahap = filter tampilan)
+        self.features   = ['yadnya', 'upacara', 'pura']
+        self.is_trained = False
+
+    @abstractmethod
+    def train(self, df):
+        ...
+
+    @abstractmethod
+    def predict(self, input_dict):
+        ...
+
+    @abstractmethod
+    def get_top_candidates(self, input_dict, n=3):
+        ...
+
+    def predict_batch(self, inputs):
+        """Prediksi banyak konteks sekaligus (default: satu per satu)."""
+        return [self.predict(d) for d in inputs]
+
+    @abstractmethod
+    def feature_classes(self):
+        """Nilai yang dikenali per fitur (termasuk 'None' & 'unknown')."""
+
+    def build_explanation(self, input_dict, nama_kidung):
+        return build_explanation(input_dict)
+
+    def export_lookup_table(self, n=10):
+        """
+        Tabel lookup murni Python: setiap kombinasi kelas fitur → id daun,
+        setiap daun → prediksi & kandidat teratas (format SnapshotPredictor).
+        """
+        if not self.is_trained:
+            return None
+        classes = self.feature_classes()
+        leaves, leaf_ids, combos = [], {}, []
+        for combo in itertools.product(*(classes[f] for f in self.features)):
+            inp  = dict(zip(self.features, combo))
+            leaf = {
+                'predict': self.predict(inp),
+                'top':     [[c['nama'], c['probabilitas']] for c in self.get_top_candidates(inp, n=n)],
+            }
+            key = json.dumps(leaf, sort_keys=True)
+            if key not in leaf_ids:
+                leaf_ids[key] = len(leaves)
+                leaves.append(leaf)
+            combos.append(leaf_ids[key])
+        return {'features': self.features, 'classes': classes, 'combos': combos, 'leaves': leaves}
+
 
-SEMUA_TAHAP = "── Semua Tahap (Panduan Lengkap) ──"
+class KidungDecisionTree(KidungEngine):
+    """DecisionTreeClassifier (entropy) atas fitur ter-encode — mesin bawaan."""
+    name = 'tree'
 
-class KidungDecisionTree:
     def __init__(self):
+        super().__init__()
         self.model = DecisionTreeClassifier(criterion='entropy', random_state=42, min_samples_leaf=1)
         self.encoders = {}
-        # Fitur utama untuk decision tree (tanpa tahap karena tahap = filter tampilan)
-        self.features = ['yadnya', 'upacara', 'pura']
-        self.is_trained = False
 
     def train(self, df):
         if df.empty:
@@ -31,15 +100,18 @@ class KidungDecisionTree:
         self.is_trained = True
         print(f"✅ Decision Tree trained: {len(df)} data")
         print(self.model.feature_importances_)
+    def _encode(self, input_dict):
+        enc = []
+        for feat in self.features:
+            val = str(input_dict.get(feat, 'None')).strip()
+            e   = self.encoders[feat]
+            enc.append(e.transform([val])[0] if val in e.classes_ else e.transform(['None'])[0])
+        return enc
+
     def predict(self, input_dict):
         try:
             if not self.is_trained: return None
-            enc = []
-            for feat in self.features:
-                val = str(input_dict.get(feat, 'None')).strip()
-                e   = self.encoders[feat]
-                enc.append(e.transform([val])[0] if val in e.classes_ else e.transform(['None'])[0])
-            idf   = pd.DataFrame([enc], columns=self.features)
+            idf   = pd.DataFrame([self._encode(input_dict)], columns=self.features)
             proba = self.model.predict_proba(idf)
             if np.max(proba) < 0.01: return None
             idx = self.model.predict(idf)[0]
@@ -48,15 +120,21 @@ class KidungDecisionTree:
             print(f"❌ Predict error: {e}")
             return None
 
+    def predict_batch(self, inputs):
+        """Satu panggilan predict_proba untuk semua konteks (hasil sama dengan predict())."""
+        if not self.is_trained or not inputs:
+            return [None] * len(inputs)
+        lookup = {f: {c: i for i, c in enumerate(self.encoders[f].classes_)} for f in self.features}
+        enc = [[lookup[f].get(str(d.get(f, 'None')).strip(), lookup[f]['None']) for f in self.features]
+               for d in inputs]
+        probas = self.model.predict_proba(pd.DataFrame(enc, columns=self.features))
+        names  = self.encoders['target'].inverse_transform(self.model.classes_[np.argmax(probas, axis=1)])
+        return [None if p.max() < 0.01 else nm for p, nm in zip(probas, names)]
+
     def get_top_candidates(self, input_dict, n=3):
         try:
             if not self.is_trained: return []
-            enc = []
-            for feat in self.features:
-                val = str(input_dict.get(feat, 'None')).strip()
-                e   = self.encoders[feat]
-                enc.append(e.transform([val])[0] if val in e.classes_ else e.transform(['None'])[0])
-            idf    = pd.DataFrame([enc], columns=self.features)
+            idf    = pd.DataFrame([self._encode(input_dict)], columns=self.features)
             probas = self.model.predict_proba(idf)[0]
             top    = np.argsort(probas)[::-1][:n]
             return [
@@ -66,21 +144,105 @@ class KidungDecisionTree:
             ]
         except: return []
 
-    def build_explanation(self, input_dict, nama_kidung):
-        yadnya  = str(input_dict.get('yadnya', '')).replace('_',' ')
-        upacara = str(input_dict.get('upacara', '')).replace('_',' ')
-        pura    = str(input_dict.get('pura', '')).replace('_',' ')
-        tahap   = str(input_dict.get('tahap', '')).replace('_',' ')
-
-        alasan = []
-        if yadnya  and yadnya  != 'None': alasan.append(f"merupakan bagian dari <strong>{yadnya}</strong>")
-        if upacara and upacara != 'None': alasan.append(f"digunakan pada upacara <strong>{upacara}</strong>")
-        if tahap   and tahap not in ('None', '', SEMUA_TAHAP):
-            alasan.append(f"dinyanyikan pada tahap <strong>{tahap}</strong>")
-        if pura    and pura not in ('None', ''):
-            alasan.append(f"dilaksanakan di <strong>{pura}</strong>")
-
-        if alasan:
-            return (f"Kidung ini direkomendasikan karena {', '.join(alasan)}, "
-                    f"sesuai dengan relasi yang tersimpan dalam basis pengetahuan ontologi Kidung Panca Yadnya.")
-        return "Kidung ini direkomendasikan berdasarkan kesesuaian konteks upacara yang dipilih."
+    def feature_classes(self):
+        return {f: self.encoders[f].classes_.tolist() for f in self.features}
+
+    def export_lookup_table(self, n=10):
+        """
+        Versi cepat untuk pohon: semua kombinasi dinilai sekaligus lewat model.apply().
+        Hasilnya identik dengan predict() / get_top_candidates().
+        """
+        if not self.is_trained:
+            return None
+        classes = self.feature_classes()
+        grids   = np.meshgrid(*[np.arange(len(classes[f])) for f in self.features], indexing='ij')
+        idf     = pd.DataFrame(np.stack([g.ravel() for g in grids], axis=1), columns=self.features)
+        leaves  = self.model.apply(idf)
+        probas  = self.model.predict_proba(idf)
+
+        leaf_ids, first_row, combo_leaf = np.unique(leaves, return_index=True, return_inverse=True)
+        leaf_table = []
+        for r in first_row:
+            p   = probas[r]
+            top = np.argsort(p)[::-1][:n]
+            names = self.encoders['target'].inverse_transform(self.model.classes_[top]).tolist()
+            leaf_table.append({
+                'predict': None if np.max(p) < 0.01 else
+                           self.encoders['target'].inverse_transform([self.model.classes_[int(np.argmax(p))]])[0],
+                'top':     [[nm, round(float(p[i])*100, 1)] for nm, i in zip(names, top) if p[i] > 0],
+            })
+        return {
+            'features': self.features,
+            'classes':  classes,
+            'combos':   combo_leaf.ravel().tolist(),
+            'leaves':   leaf_table,
+        }
+
+
+class ExactMatchEngine(KidungEngine):
+    """
+    Lookup aturan persis dari relasi ontologi: kombinasi (yadnya, upacara, pura) → kidung
+    yang tercatat dengan relasi tersebut, dihitung sekali saat train().
+    Nilai kosong/tidak dikenal = bebas; bila kombinasi tidak ada, pura lalu upacara
+    lalu yadnya dilepas. Probabilitas = porsi kidung dalam kelompok yang cocok.
+    """
+    name = 'exact'
+    ANY  = '*'
+
+    def __init__(self):
+        super().__init__()
+        self.values = {}
+        self.rules  = {}
+
+    def train(self, df):
+        if df.empty:
+            print("⚠️ DataFrame kosong.")
+            return
+        rows = df[self.features + ['target']].astype(str).apply(lambda c: c.str.strip())
+        self.values = {f: set(rows[f]) - {'None', 'unknown'} for f in self.features}
+        counts = {}
+        for *vals, target in rows.itertuples(index=False):
+            for key in itertools.product(*((v, self.ANY) for v in vals)):
+                counts.setdefault(key, Counter())[target] += 1
+        # urut frekuensi, seri → nama (sama dengan argmax pada kelas LabelEncoder yang terurut)
+        self.rules = {
+            key: [(nm, c / sum(cnt.values())) for nm, c in sorted(cnt.items(), key=lambda x: (-x[1], x[0]))]
+            for key, cnt in counts.items()
+        }
+        self.is_trained = True
+        print(f"✅ Exact-match rules: {len(df)} data, {len(self.rules)} kombinasi")
+
+    def _match(self, input_dict):
+        key = [str(input_dict.get(f, 'None')).strip() for f in self.features]
+        key = [v if v in self.values[f] else self.ANY for f, v in zip(self.features, key)]
+        for keep in range(len(key), -1, -1):
+            rule = self.rules.get(tuple(key[:keep]) + (self.ANY,) * (len(key) - keep))
+            if rule:
+                return rule
+        return []
+
+    def predict(self, input_dict):
+        if not self.is_trained: return None
+        rule = self._match(input_dict)
+        return rule[0][0] if rule else None
+
+    def get_top_candidates(self, input_dict, n=3):
+        if not self.is_trained: return []
+        return [{'nama': nm, 'probabilitas': round(p * 100, 1)} for nm, p in self._match(input_dict)[:n]]
+
+    def feature_classes(self):
+        return {f: sorted(self.values[f] | {'None', 'unknown'}) for f in self.features}
+
+
+ENGINES = {
+    KidungDecisionTree.name: KidungDecisionTree,
+    ExactMatchEngine.name:   ExactMatchEngine,
+}
+
+
+def create_engine(name=None):
+    """Buat mesin berdasarkan nama (default SARIKIDUNG_ENGINE, 'tree')."""
+    name = name or DEFAULT_ENGINE
+    if name not in ENGINES:
+        raise ValueError(f"Mesin '{name}' tidak dikenal (pilihan: {', '.join(ENGINES)})")
+    return ENGINES[name]()
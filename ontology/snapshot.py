@@ -0,0 +1,191 @@
+"""
+Snapshot katalog baca-saja.
+
+Ontologi dikompilasi sekali menjadi satu file biner yang tidak berubah:
+
+    MAGIC | panjang header (8 byte) | header JSON | blob record JSON
+
+Header memuat baris ringkas (kolom DataFrame), indeks target → offset,
+daftar opsi _Ref, tabel lookup model, tabel kidung terkait, dan playlist upacara.
+Detail lengkap (teks, makna, audio) ada di blob dan dibaca lewat mmap,
+sehingga worker yang di-fork berbagi halaman file yang sama.
+
+Proses serving cukup memuat modul ini — tanpa owlready2 dan tanpa sklearn.
+Kompilasi: python -m ontology.snapshot
+"""
+import json
+import mmap
+import os
+import struct
+import tempfile
+import time
+
+from ontology.loader import BASE_DIR, ONTO_PATH, get_ontology_version
+from ontology.playlist import CeremonyPlaylists
+from ontology.query import build_explanation, get_kidung_details, get_reference_options
+
+SNAPSHOT_PATH = os.getenv('SARIKIDUNG_SNAPSHOT', os.path.join(BASE_DIR, "kidung.snapshot"))
+MAGIC         = b"SKSNAP1\n"
+
+
+def collect_snapshot_data(onto, df):
+    """Bagian snapshot yang dibaca dari owlready2: (detail per target, opsi _Ref)."""
+    targets = df['target'].tolist() if not df.empty else []
+    return get_kidung_details(onto, targets), get_reference_options(onto)
+
+
+def compile_snapshot(onto, df, engine, related_index=None, playlists=None, path=SNAPSHOT_PATH):
+    """Tulis snapshot dari ontologi yang sudah dimuat."""
+    details, options = collect_snapshot_data(onto, df)
+    return write_snapshot(df, details, options, engine, related_index, playlists, path=path)
+
+
+def write_snapshot(df, details, options, engine, related_index=None, playlists=None,
+                   version=None, modified=None, path=SNAPSHOT_PATH):
+    """
+    Tulis snapshot dari data yang sudah dikumpulkan — tanpa menyentuh owlready2.
+    version/modified: sidik jari kidung.owx saat data dikumpulkan (default: file saat ini).
+    """
+    rows    = df.to_dict(orient='records') if not df.empty else []
+    targets = [r['target'] for r in rows]
+
+    blob, offsets, index = bytearray(), [], {}
+    for t in targets:
+        if t not in details:
+            continue
+        rec = json.dumps(details[t], ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        index[t] = len(offsets)
+        offsets.append([len(blob), len(rec)])
+        blob += rec
+
+    header = json.dumps({
+        "version":  version or get_ontology_version(),
+        "modified": int(modified or os.path.getmtime(ONTO_PATH)),
+        "rows":     rows,
+        "index":    index,
+        "offsets":  offsets,
+        "options":  options,
+        "predict":  engine.export_lookup_table() if engine is not None else None,
+        "related":  {t: related_index.related(t) for t in targets} if related_index is not None else {},
+        "playlists": playlists.export() if playlists is not None else None,
+    }, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    # File sementara unik di direktori yang sama: beberapa penulis (proses admin,
+    # subprocess kompilasi worker) tidak saling menimpa sebelum os.replace atomik
+    fd, tmp = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp",
+                               dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(MAGIC)
+            f.write(struct.pack("<Q", len(header)))
+            f.write(header)
+            f.write(blob)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    print(f"✅ Snapshot ditulis: {path} ({len(index)} kidung, {len(header) + len(blob)} byte)")
+    return path
+
+
+class KidungSnapshot:
+    """Pembaca snapshot: header di memori, detail record dibaca dari mmap saat diminta."""
+
+    def __init__(self, path=SNAPSHOT_PATH):
+        self.path  = path
+        self.mtime = os.path.getmtime(path)
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} bukan file snapshot SariKidung.")
+        start = len(MAGIC) + 8
+        (hlen,) = struct.unpack("<Q", self._mm[len(MAGIC):start])
+        header  = json.loads(self._mm[start:start + hlen])
+        self._base    = start + hlen
+        self.version  = header["version"]
+        self.modified = header["modified"]
+        self.rows     = header["rows"]
+        self.index    = header["index"]
+        self.offsets  = header["offsets"]
+        self.options  = header["options"]
+        self.related_table = header["related"]
+        self.predictor = SnapshotPredictor(header["predict"]) if header["predict"] else None
+        self.playlists = CeremonyPlaylists.from_table(header["playlists"]) \
+                         if header.get("playlists") is not None else None
+
+    def __len__(self):
+        return len(self.rows)
+
+    def detail(self, nama):
+        i = self.index.get(nama)
+        if i is None:
+            return None
+        off, size = self.offsets[i]
+        return json.loads(self._mm[self._base + off:self._base + off + size])
+
+    def details(self, nama_list):
+        out = {}
+        for nama in nama_list:
+            rec = self.detail(nama)
+            if rec is not None:
+                out[nama] = rec
+        return out
+
+    def related(self, nama):
+        return self.related_table.get(nama)
+
+
+class SnapshotPredictor:
+    """Pengganti mesin rekomendasi (KidungEngine) saat serving — lookup tabel hasil export_lookup_table()."""
+
+    def __init__(self, table):
+        self.features = table["features"]
+        self.classes  = table["classes"]
+        self.pos      = {f: {c: i for i, c in enumerate(self.classes[f])} for f in self.features}
+        self.combos   = table["combos"]
+        self.leaves   = table["leaves"]
+        self.is_trained = True
+
+    def _leaf(self, input_dict):
+        flat = 0
+        for feat in self.features:
+            val = str(input_dict.get(feat, 'None')).strip()
+            pos = self.pos[feat]
+            flat = flat * len(pos) + pos.get(val, pos['None'])
+        return self.leaves[self.combos[flat]]
+
+    def predict(self, input_dict):
+        return self._leaf(input_dict)['predict']
+
+    def get_top_candidates(self, input_dict, n=3):
+        return [{'nama': nm, 'probabilitas': p} for nm, p in self._leaf(input_dict)['top'][:n]]
+
+    def build_explanation(self, input_dict, nama_kidung):
+        return build_explanation(input_dict)
+
+
+def snapshot_is_current(path=SNAPSHOT_PATH):
+    """True bila snapshot ada dan dibuat dari isi kidung.owx saat ini."""
+    if not os.path.exists(path):
+        return False
+    try:
+        return KidungSnapshot(path).version == get_ontology_version()
+    except Exception:
+        return False
+
+
+if __name__ == '__main__':
+    from ontology.loader import load_ontology, get_kidung_dataframe
+    from ontology.rules import create_engine
+    from ontology.related import RelatedKidungIndex
+    from ontology.playlist import get_urutan_tahap
+
+    t0     = time.time()
+    onto   = load_ontology()
+    df     = get_kidung_dataframe(onto)
+    engine = create_engine()
+    engine.train(df)
+    compile_snapshot(onto, df, engine, RelatedKidungIndex().build(onto, df),
+                     CeremonyPlaylists().build(df, get_urutan_tahap(onto)))
+    print(f"⏱️  {time.time() - t0:.2f} detik")
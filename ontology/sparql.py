@@ -0,0 +1,217 @@
+import atexit
+import csv
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+
+class SparqlError(Exception):
+    """Query ditolak (bukan SELECT, sintaks salah, atau melewati batas waktu)."""
+
+
+class SparqlTimeout(SparqlError):
+    """Query valid, tetapi dihentikan karena melewati batas waktu."""
+
+
+class _Quadstore:
+    """Salinan quadstore owlready2 (file sqlite sementara) untuk satu versi ontologi."""
+
+    def __init__(self, world, path, version):
+        self.world   = world
+        self.path    = path
+        self.version = version
+        self.users   = 0
+        self.retired = False
+
+    def close(self):
+        self.world.close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+
+class SparqlService:
+    """
+    Query SPARQL baca-saja atas kidung.owx, terpisah dari world owlready2 milik app:
+    - file ontologi dimuat ke World owlready2 tersendiri (quadstore sqlite sementara),
+      dibuat ulang hanya bila isi file berubah — onto_lock app tidak pernah dipegang
+    - setiap query dieksekusi lewat koneksi sqlite baca-saja miliknya sendiri, dan
+      progress handler pada koneksi itu menghentikan query setelah timeout detik
+      (termasuk agregat/ORDER BY yang belum menghasilkan baris pertama)
+    - setiap teks query di-parse sekali per versi ontologi (cache prepared query, LRU)
+    - hasil di-cache per (teks query, versi ontologi), jumlah baris dibatasi max_rows
+    """
+
+    def __init__(self, onto_path, max_rows=1000, timeout=5.0, prepared_size=256, result_size=128):
+        self.onto_path     = onto_path
+        self.max_rows      = max_rows
+        self.timeout       = timeout
+        self.prepared_size = prepared_size
+        self.result_size   = result_size
+        self._prepared     = OrderedDict()
+        self._results      = OrderedDict()
+        self._store        = None
+        self._signature    = None
+        self._lock         = threading.Lock()
+        self.stats         = {'prepared_hits': 0, 'result_hits': 0, 'executed': 0, 'timeouts': 0}
+        atexit.register(self.close)
+
+    def clear(self):
+        with self._lock:
+            self._prepared.clear()
+            self._results.clear()
+
+    def close(self):
+        with self._lock:
+            if self._store is not None:
+                self._retire(self._store)
+                self._store = None
+
+    def run(self, query):
+        """Kembalikan dict {columns, rows, truncated, elapsed_ms, version} (rows sudah JSON-friendly)."""
+        with self._lock:
+            store = self._current()
+            key   = (query, store.version)
+            if key in self._results:
+                self._results.move_to_end(key)
+                self.stats['result_hits'] += 1
+                return self._results[key]
+            prepared = self._prepare(store.world, query, store.version)
+            store.users += 1
+
+        try:
+            t0 = time.perf_counter()
+            raw, truncated = self._fetch(store.path, prepared)
+            elapsed = round((time.perf_counter() - t0) * 1000, 2)
+            with self._lock:
+                # Konversi storid → entitas memakai world salinan, bukan world app
+                rows = [[_to_json_value(v) for v in row] for row in prepared.execute(execute_raw_result=raw)]
+                self.stats['executed'] += 1
+                result = {
+                    'columns':    [c.lstrip('?') for c in prepared.column_names],
+                    'rows':       rows,
+                    'truncated':  truncated,
+                    'elapsed_ms': elapsed,
+                    'version':    store.version,
+                }
+                self._results[key] = result
+                if len(self._results) > self.result_size:
+                    self._results.popitem(last=False)
+        finally:
+            with self._lock:
+                store.users -= 1
+                if store.retired and store.users == 0:
+                    store.close()
+        return result
+
+    def _fetch(self, path, prepared):
+        """Eksekusi SQL hasil terjemahan di koneksi baca-saja tersendiri → (baris mentah, terpotong)."""
+        deadline = time.monotonic() + self.timeout
+        conn     = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        conn.set_progress_handler(lambda: 1 if time.monotonic() > deadline else 0, 10000)
+        try:
+            rows = conn.execute(prepared.sql).fetchmany(self.max_rows + 1)
+        except sqlite3.OperationalError as e:
+            if 'interrupt' in str(e).lower():
+                with self._lock:
+                    self.stats['timeouts'] += 1
+                raise SparqlTimeout(f"Query melewati batas waktu {self.timeout:g} detik.")
+            raise SparqlError(str(e))
+        finally:
+            conn.close()
+        return rows[:self.max_rows], len(rows) > self.max_rows
+
+    # ─── SALINAN QUADSTORE ──────────────────────────────────────
+    def _current(self):
+        """Quadstore untuk isi kidung.owx saat ini (dipanggil di bawah self._lock)."""
+        st = os.stat(self.onto_path)
+        signature = (st.st_mtime_ns, st.st_size)
+        if self._store is not None and signature == self._signature:
+            return self._store
+        with open(self.onto_path, "rb") as f:
+            data = f.read()
+        version = hashlib.sha1(data).hexdigest()[:12]   # sama dengan get_ontology_version()
+        if self._store is None or version != self._store.version:
+            store = self._load(data, version)
+            if self._store is not None:
+                self._retire(self._store)
+            self._store = store
+            self._prepared.clear()   # prepared query terikat ke world lama
+        self._signature = signature
+        return self._store
+
+    def _load(self, data, version):
+        from owlready2 import World
+
+        fd, path = tempfile.mkstemp(prefix="sarikidung-sparql-", suffix=".sqlite3")
+        os.close(fd)
+        os.unlink(path)   # owlready2 membuat file quadstore sendiri
+        world = World(filename=path, exclusive=False)
+        world.get_ontology(f"file://{self.onto_path}").load(fileobj=io.BytesIO(data))
+        world.save()
+        return _Quadstore(world, path, version)
+
+    def _retire(self, store):
+        store.retired = True
+        if store.users == 0:
+            store.close()
+
+    def _prepare(self, world, query, version):
+        from owlready2.sparql.main import PreparedSelectQuery
+
+        key = (query, version)
+        if key in self._prepared:
+            self._prepared.move_to_end(key)
+            self.stats['prepared_hits'] += 1
+            return self._prepared[key]
+        try:
+            prepared = world.prepare_sparql(query)
+        except Exception as e:
+            raise SparqlError(f"Query tidak valid: {e}")
+        if not isinstance(prepared, PreparedSelectQuery):
+            raise SparqlError("Hanya query SELECT yang diizinkan (endpoint baca-saja).")
+        self._prepared[key] = prepared
+        if len(self._prepared) > self.prepared_size:
+            self._prepared.popitem(last=False)
+        return prepared
+
+
+def _to_json_value(v):
+    if v is None or isinstance(v, (bool, int, float)):
+        return v
+    iri = getattr(v, 'iri', None)
+    if iri is not None:
+        return iri
+    return str(v)
+
+
+def stream_json(result, chunk_rows=200):
+    """Serialisasi hasil sebagai JSON, dikirim bertahap per potongan baris."""
+    yield ('{"status":"success","columns":' + json.dumps(result['columns'], ensure_ascii=False)
+           + f',"truncated":{json.dumps(result["truncated"])},"elapsed_ms":{result["elapsed_ms"]},"rows":[')
+    rows = result['rows']
+    for i in range(0, len(rows), chunk_rows):
+        part = ','.join(json.dumps(r, ensure_ascii=False) for r in rows[i:i + chunk_rows])
+        yield (',' if i else '') + part
+    yield ']}'
+
+
+def stream_csv(result, chunk_rows=200):
+    """Serialisasi hasil sebagai CSV (baris header = nama variabel)."""
+    buf    = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(result['columns'])
+    rows = result['rows']
+    for i in range(0, len(rows), chunk_rows):
+        writer.writerows(rows[i:i + chunk_rows])
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    yield buf.getvalue()
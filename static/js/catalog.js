@@ -0,0 +1,82 @@
+/**
+ * SariKidung — Katalog Offline
+ * Menyimpan bundle katalog (ringkasan, graf opsi kuesioner, lirik & detail) di Cache Storage.
+ * Pemuatan pertama mengunduh /api/catalog/bundle; berikutnya hanya manifest, lalu record
+ * yang hash-nya berubah diambil lewat /api/kidung/batch (delta).
+ */
+const SariCatalog = (function () {
+  'use strict';
+
+  const CACHE_NAME = 'sarikidung-catalog';
+  const DATA_KEY   = '/__catalog__/data.json';
+  const BATCH_MAX  = 100;
+  let loading      = null;
+
+  async function readLocal() {
+    if (!('caches' in window)) return null;
+    try {
+      const res = await (await caches.open(CACHE_NAME)).match(DATA_KEY);
+      return res ? await res.json() : null;
+    } catch (e) { return null; }
+  }
+
+  async function saveLocal(data) {
+    if (!('caches' in window)) return;
+    try {
+      const cache = await caches.open(CACHE_NAME);
+      await cache.put(DATA_KEY, new Response(JSON.stringify(data), { headers: { 'Content-Type': 'application/json' } }));
+    } catch (e) { /* kuota penuh — tetap jalan tanpa cache lokal */ }
+  }
+
+  async function fetchJSON(url, opts) {
+    const res = await fetch(url, opts);
+    if (!res.ok) throw new Error(`HTTP ${res.status}`);
+    const data = await res.json();
+    if (data.status !== 'success') throw new Error(data.message || 'gagal');
+    return data;
+  }
+
+  async function applyDelta(local, manifest) {
+    const changed = Object.keys(manifest.hashes).filter(t => local.hashes[t] !== manifest.hashes[t]);
+    const records = {};
+    Object.keys(manifest.hashes).forEach(t => { if (local.records[t]) records[t] = local.records[t]; });
+    for (let i = 0; i < changed.length; i += BATCH_MAX) {
+      const part = await fetchJSON('/api/kidung/batch', {
+        method: 'POST', headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ targets: changed.slice(i, i + BATCH_MAX) }),
+      });
+      Object.assign(records, part.records);
+    }
+    return { ...manifest, records };
+  }
+
+  async function sync() {
+    const local = await readLocal();
+    if (local && !navigator.onLine) return local;
+    try {
+      if (!local) {
+        const bundle = await fetchJSON('/api/catalog/bundle');
+        await saveLocal(bundle);
+        return bundle;
+      }
+      const manifest = await fetchJSON('/api/catalog/manifest');
+      if (manifest.version === local.version) return local;
+      const updated = await applyDelta(local, manifest);
+      await saveLocal(updated);
+      return updated;
+    } catch (e) {
+      return local;   // offline / server error — pakai salinan lokal bila ada
+    }
+  }
+
+  return {
+    /** Katalog lokal (sinkron bila online). Hasil: {version, rows, graph, records, hashes} atau null. */
+    load() { return loading || (loading = sync()); },
+    /** Salinan lokal saja, tanpa jaringan. */
+    local: readLocal,
+  };
+})();
+
+if ('serviceWorker' in navigator) {
+  window.addEventListener('load', () => navigator.serviceWorker.register('/sw.js').catch(() => {}));
+}
@@ -0,0 +1,44 @@
+/* SariKidung service worker — halaman & aset dari cache dulu, diperbarui di latar belakang.
+   Data katalog (lirik, graf opsi) dikelola static/js/catalog.js di cache "sarikidung-catalog". */
+const SHELL_CACHE = 'sarikidung-shell-v2';
+const SHELL_PAGES = ['/', '/home', '/library', '/browsing', '/about'];
+const SHELL_URLS  = [
+    ...SHELL_PAGES,
+    '/static/style.css', '/static/js/script.js', '/static/js/catalog.js',
+    '/static/img/logo_sarikidung.png',
+];
+
+// Hanya halaman shell & aset /static/ origin sendiri tanpa query string yang di-cache;
+// API, admin, dan permintaan lintas origin selalu langsung ke jaringan
+function cacheable(url) {
+    if (url.origin !== location.origin || url.search) return false;
+    return SHELL_PAGES.includes(url.pathname) || url.pathname.startsWith('/static/');
+}
+
+self.addEventListener('install', event => {
+    event.waitUntil(caches.open(SHELL_CACHE).then(c => c.addAll(SHELL_URLS)).then(() => self.skipWaiting()));
+});
+
+self.addEventListener('activate', event => {
+    event.waitUntil(
+        caches.keys()
+            .then(keys => Promise.all(keys.filter(k => k.startsWith('sarikidung-shell') && k !== SHELL_CACHE).map(k => caches.delete(k))))
+            .then(() => self.clients.claim())
+    );
+});
+
+self.addEventListener('fetch', event => {
+    const req = event.request;
+    if (req.method !== 'GET' || !cacheable(new URL(req.url))) return;
+
+    // stale-while-revalidate
+    event.respondWith(caches.open(SHELL_CACHE).then(async cache => {
+        const cached  = await cache.match(req);
+        const network = fetch(req).then(res => {
+            if (res.ok && res.type === 'basic') cache.put(req, res.clone());
+            return res;
+        }).catch(() => cached || Response.error());
+        if (cached) { event.waitUntil(network); return cached; }
+        return network;
+    }));
+});